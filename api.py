@@ -0,0 +1,143 @@
+"""
+Read-only HTTP API served from main.py's aiohttp server.
+
+/metrics renders metrics.py's counters and histograms on each scrape.
+
+/health, /api/state and /api/tasks are answered from an in-memory snapshot:
+each response body is serialized once, together with its ETag, and reused
+until the owner's state changes (the store's revision moves), the day rolls
+over (the week number may change) or the task catalog is reloaded. Serving a
+request never touches the disk; clients that send If-None-Match get a 304.
+Rebuilding the bodies happens on the state I/O thread (state.run_locked).
+
+refresh_job() — run on an interval by main.py — is the only place that checks
+state.json and tasks.json for edits made outside this process.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+from datetime import date
+
+from aiohttp import web
+
+from config import API_TOKEN
+import metrics
+from state import get_store, get_current_week, get_completed_tasks, run_locked
+from tasks import catalog, get_tasks_for_week
+
+logger = logging.getLogger(__name__)
+
+# State fields the dashboard reads; the rest (outbox, caches) stays private
+PUBLIC_STATE_KEYS = (
+    "start_date",
+    "completed",
+    "seen_issues",
+    "notify_index",
+    "last_update_id",
+    "task_hashes",
+)
+
+
+class Body:
+    """A pre-serialized JSON response and its ETag."""
+
+    def __init__(self, data):
+        self.data = json.dumps(data, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha256(self.data).hexdigest()[:16] + '"'
+
+
+class Snapshot:
+    """Responses for the read endpoints, rebuilt only when their inputs change."""
+
+    def __init__(self):
+        self._key = None
+        self._catalog_version = None
+        self.bodies: dict[str, Body] = {}
+
+    def refresh(self):
+        """Pick up on-disk edits to state and tasks (this does stat the files)."""
+        get_store().check()
+        self._catalog_version = catalog.version
+
+    async def current(self) -> dict[str, Body]:
+        if self._catalog_version is None:
+            await run_locked(None, self.refresh)
+        key = (get_store().revision, date.today(), self._catalog_version)
+        if key != self._key:
+            await run_locked(None, self._build)
+            self._key = key
+        return self.bodies
+
+    def _build(self):
+        state = get_store().get()
+        week = get_current_week()
+        tasks = get_tasks_for_week(week)
+        done = len(get_completed_tasks(week))
+        self.bodies = {
+            "health": Body({
+                "status": "ok",
+                "week": week,
+                "progress": f"{done}/{len(tasks)}",
+            }),
+            "state": Body({k: state[k] for k in PUBLIC_STATE_KEYS if k in state}),
+            "tasks": Body(catalog.as_dict()),
+        }
+
+
+snapshot = Snapshot()
+
+
+async def refresh_job():
+    """Scheduler job; the stat calls run on the state I/O thread."""
+    await run_locked(None, snapshot.refresh)
+
+
+async def _respond(request, name: str) -> web.Response:
+    body = (await snapshot.current())[name]
+    headers = {"ETag": body.etag, "Cache-Control": "no-cache"}
+    if body.etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body.data, content_type="application/json", headers=headers)
+
+
+def _authorized(request) -> bool:
+    if not API_TOKEN:
+        return True
+    given = request.headers.get("Authorization", "")
+    return hmac.compare_digest(given, f"Bearer {API_TOKEN}")
+
+
+async def health_handler(request):
+    """Health check endpoint — keeps Render from sleeping."""
+    return await _respond(request, "health")
+
+
+async def state_handler(request):
+    if not _authorized(request):
+        return web.Response(status=401)
+    return await _respond(request, "state")
+
+
+async def tasks_handler(request):
+    if not _authorized(request):
+        return web.Response(status=401)
+    return await _respond(request, "tasks")
+
+
+async def metrics_handler(request):
+    if not _authorized(request):
+        return web.Response(status=401)
+    return web.Response(
+        text=metrics.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+def add_routes(app: web.Application):
+    app.router.add_get("/", health_handler)
+    app.router.add_get("/health", health_handler)
+    app.router.add_get("/api/state", state_handler)
+    app.router.add_get("/api/tasks", tasks_handler)
+    app.router.add_get("/metrics", metrics_handler)
@@ -0,0 +1,237 @@
+"""
+Local stand-ins for the Telegram Bot API, Callmebot and the GitHub REST API.
+
+One aiohttp app serves all three (point TELEGRAM_API_URL, CALLMEBOT_API_URL
+and GITHUB_API_URL at it). Every request can be delayed by a fixed latency
+and failed with a given probability, and every call is counted per endpoint
+so the benchmark can report how many HTTP round trips a run made.
+
+GitHub listings are paginated like the real API: at most
+FakeConfig.page_size items per page, with a Link: rel="next" header while
+more pages remain. Search results cover every repo: qualifier in the query.
+
+The Telegram side also speaks enough of the Bot API (getMe, long-polling
+getUpdates, form-encoded sendMessage) for python-telegram-bot, so the same
+fakes drive main.py under load_main.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.0  # seconds added to every response
+    error_rate: float = 0.0  # chance of a 500 (or 429 on sendMessage)
+    chat_id: str = "1000"
+    pending_updates: int = 0  # /done messages waiting in getUpdates
+    issues_per_repo: int = 3
+    page_size: int = 100  # GitHub's largest per_page
+    seed: int = 0
+
+
+@dataclass
+class FakeServers:
+    config: FakeConfig
+    calls: Counter = field(default_factory=Counter)
+    # update_id -> perf_counter() when getUpdates first returned it
+    handed_out: dict = field(default_factory=dict)
+    _next_update_id: int = field(default=1, init=False)
+    _message_id: int = field(default=0, init=False)
+    _pending: list = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.config.seed)
+        self._new_update = asyncio.Event()
+        self.reset()
+
+    def reset(self):
+        """Forget call counts and queue a fresh batch of pending updates."""
+        self.calls.clear()
+        self.handed_out.clear()
+        self._pending = []
+        for i in range(self.config.pending_updates):
+            self.push_update(int(self.config.chat_id), f"/done {i % 6 + 1}")
+
+    async def _delay_or_fail(self, name: str, fail_status: int = 500):
+        self.calls[name] += 1
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        if self._rng.random() < self.config.error_rate:
+            if fail_status == 429:
+                return web.json_response(
+                    {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}},
+                    status=429,
+                )
+            return web.json_response({"ok": False}, status=fail_status)
+        return None
+
+    # -- Telegram --
+
+    def push_update(self, chat_id: int, text: str) -> int:
+        """Queue an incoming message for getUpdates; returns its update_id."""
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        command = text.split()[0] if text.startswith("/") else None
+        self._pending.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+                "text": text,
+                **(
+                    {"entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]}
+                    if command
+                    else {}
+                ),
+            },
+        })
+        self._new_update.set()
+        return update_id
+
+    async def _params(self, request) -> dict:
+        params = dict(request.query)
+        if request.method == "POST":
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    async def telegram(self, request):
+        """Bot API methods; run.py uses GET/JSON, python-telegram-bot posts forms."""
+        method = request.match_info["method"]
+        if failed := await self._delay_or_fail(
+            f"telegram.{method}", 429 if method == "sendMessage" else 500
+        ):
+            return failed
+        params = await self._params(request)
+
+        if method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "sendMessage":
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        self._pending = [u for u in self._pending if u["update_id"] >= offset]
+        if not self._pending and float(params.get("timeout", 0)) > 0:
+            # Long polling: hold the request until something arrives
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params["timeout"]))
+            except asyncio.TimeoutError:
+                pass
+        batch = self._pending[:limit]
+        now = time.perf_counter()
+        for update in batch:
+            self.handed_out.setdefault(update["update_id"], now)
+        return batch
+
+    # -- Callmebot --
+
+    async def whatsapp(self, request):
+        if failed := await self._delay_or_fail("callmebot.whatsapp"):
+            return failed
+        return web.Response(text="Message queued")
+
+    # -- GitHub --
+
+    def _issues(self, repo: str, label: str | None) -> list[dict]:
+        labels = [label] if label else ["good first issue"]
+        return [
+            {
+                "number": n,
+                "created_at": f"2020-01-01T00:00:{n % 60:02d}Z",
+                "html_url": f"https://github.com/{repo}/issues/{n}",
+                "title": f"Fake issue {n} in {repo}",
+                "labels": [{"name": name} for name in labels],
+                "repository_url": f"https://api.github.com/repos/{repo}",
+            }
+            for n in range(self.config.issues_per_repo, 0, -1)
+        ]
+
+    def _paginate(self, request, items: list) -> tuple[list, dict]:
+        """One page of items, plus the Link header if more pages remain."""
+        size = self.config.page_size
+        page = int(request.query.get("page", 1))
+        headers = {}
+        if page * size < len(items):
+            next_path = request.rel_url.update_query(page=str(page + 1))
+            next_url = f"{request.scheme}://{request.host}{next_path}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return items[(page - 1) * size : page * size], headers
+
+    def _github_response(self, request, body, headers: dict | None = None) -> web.Response:
+        data = json.dumps(body).encode()
+        etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+        headers = {
+            **(headers or {}),
+            "ETag": etag,
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "4999",
+            "X-RateLimit-Reset": "9999999999",
+        }
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=data, content_type="application/json", headers=headers)
+
+    async def repo_issues(self, request):
+        if failed := await self._delay_or_fail("github.issues"):
+            return failed
+        repo = f"{request.match_info['owner']}/{request.match_info['name']}"
+        label = request.query.get("labels")
+        items, headers = self._paginate(request, self._issues(repo, label))
+        return self._github_response(request, items, headers)
+
+    async def search_issues(self, request):
+        if failed := await self._delay_or_fail("github.search"):
+            return failed
+        repos = re.findall(r"repo:(\S+)", request.query.get("q", "")) or ["fake/search"]
+        matches = [item for repo in repos for item in self._issues(repo, None)]
+        # Newest first across repos, like sort=created&order=desc
+        matches.sort(key=lambda item: item["created_at"], reverse=True)
+        items, headers = self._paginate(request, matches)
+        return self._github_response(
+            request, {"total_count": len(matches), "items": items}, headers
+        )
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.telegram)
+        app.router.add_get("/whatsapp.php", self.whatsapp)
+        app.router.add_get("/repos/{owner}/{name}/issues", self.repo_issues)
+        app.router.add_get("/search/issues", self.search_issues)
+        return app
+
+
+async def start(servers: FakeServers, port: int = 0) -> tuple[web.AppRunner, str]:
+    """Serve the fakes on localhost. Returns the runner and the base URL."""
+    runner = web.AppRunner(servers.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
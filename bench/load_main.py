@@ -0,0 +1,278 @@
+"""
+Load generator for the long-running bot (main.py + bot.py).
+
+Runs the real bot application, polling the fake Telegram API from
+fake_servers.py, while a generator thread feeds /done, /status and /tasks
+messages at Poisson-distributed rates from a pool of tenant chats. main.py's
+scheduler jobs run at the same time, compressed onto a short interval.
+
+Reported at the end (and saved as JSON):
+  - handler latency p50/p95/p99: from getUpdates handing the update out to
+    the handler finishing (its reply included), plus the handler-only time
+  - event-loop stall: how late a 10 ms ticker wakes up; blocking work such as
+    synchronous state.json writes shows up here
+  - throughput: handled updates per second, and scheduler job runs
+
+    python bench/load_main.py --duration 30 --done-rate 5 --status-rate 2 --tasks-rate 2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from fake_servers import FakeConfig, FakeServers, start
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TICK = 0.01  # stall monitor period (seconds)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _ms(samples: list[float]) -> dict:
+    return {
+        "p50": round(percentile(samples, 50) * 1000, 2),
+        "p95": round(percentile(samples, 95) * 1000, 2),
+        "p99": round(percentile(samples, 99) * 1000, 2),
+        "max": round(max(samples, default=0) * 1000, 2),
+    }
+
+
+class FakeTelegramThread(threading.Thread):
+    """Runs the fake servers and the traffic generator on their own loop."""
+
+    def __init__(self, servers: FakeServers, args, chats: list[int]):
+        super().__init__(daemon=True)
+        self.servers = servers
+        self.args = args
+        self.chats = chats
+        self.ready = threading.Event()
+        self.base_url = ""
+        self.sent = 0
+        self._done = None
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._done = asyncio.Event()
+        runner, self.base_url = await start(self.servers)
+        self.ready.set()
+        self._loop = asyncio.get_running_loop()
+        await self._done.wait()
+        await runner.cleanup()
+
+    def start_traffic(self, duration: float):
+        asyncio.run_coroutine_threadsafe(self._traffic(duration), self._loop)
+
+    async def _traffic(self, duration: float):
+        rng = random.Random(self.args.seed)
+        rates = {
+            "/done": self.args.done_rate,
+            "/status": self.args.status_rate,
+            "/tasks": self.args.tasks_rate,
+        }
+        end = time.perf_counter() + duration
+
+        async def feed(command: str, rate: float):
+            while rate > 0:
+                await asyncio.sleep(rng.expovariate(rate))
+                if time.perf_counter() >= end:
+                    return
+                text = f"/done {rng.randint(1, 6)}" if command == "/done" else command
+                self.servers.push_update(rng.choice(self.chats), text)
+                self.sent += 1
+
+        await asyncio.gather(*(feed(c, r) for c, r in rates.items()))
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._done.set)
+
+
+async def _stall_monitor(stalls: list[float], stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        stalls.append(max(0.0, loop.time() - start - TICK))
+
+
+def _configure_env(workdir: str, base_url: str, chats: list[int], owner: int):
+    monday = date.today() - timedelta(days=date.today().weekday())
+    os.environ.update({
+        "STATE_FILE": os.path.join(workdir, "state.json"),
+        "TENANT_STATE_DIR": os.path.join(workdir, "tenants"),
+        "MULTI_TENANT": "1",
+        "TENANT_CHAT_IDS": ",".join(str(c) for c in chats),
+        "START_DATE": monday.isoformat(),
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": str(owner),
+        "CALLMEBOT_PHONE": "",
+        "GITHUB_TOKEN": "bench",
+        "TELEGRAM_API_URL": base_url,
+        "CALLMEBOT_API_URL": base_url,
+        "GITHUB_API_URL": base_url,
+    })
+    os.environ.pop("TELEGRAM_WEBHOOK_URL", None)
+    # Tenants need a state file with a start date of their own
+    os.makedirs(os.environ["TENANT_STATE_DIR"], exist_ok=True)
+    for chat in chats:
+        with open(os.path.join(os.environ["TENANT_STATE_DIR"], f"{chat}.json"), "w") as f:
+            json.dump({"start_date": monday.isoformat()}, f)
+
+
+async def run_load(args, fake: FakeTelegramThread) -> dict:
+    sys.path.insert(0, ROOT)
+    from apscheduler.events import EVENT_JOB_EXECUTED
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    import http_client
+    import main as bot_main
+    from bot import build_app
+    from config import STATE_FLUSH_DELAY, TIMEZONE
+    from state import flush_state, get_store
+
+    # main.py configures INFO logging on import; keep the report readable
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.ERROR)
+    get_store().flush_delay = STATE_FLUSH_DELAY
+    await http_client.start()
+
+    latencies, handler_times = [], []
+
+    def timed(callback):
+        async def wrapper(update, context):
+            start = time.perf_counter()
+            await callback(update, context)
+            done = time.perf_counter()
+            handler_times.append(done - start)
+            handed_out = fake.servers.handed_out.get(update.update_id)
+            if handed_out is not None:
+                latencies.append(done - handed_out)
+        return wrapper
+
+    app = build_app()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = timed(handler.callback)
+    await app.initialize()
+    await app.start()
+    await app.updater.start_polling(poll_interval=0, timeout=1)
+
+    sched = bot_main.setup_scheduler()
+    for job in sched.get_jobs():
+        job.reschedule(IntervalTrigger(seconds=args.job_interval, timezone=TIMEZONE))
+    job_runs = []
+    sched.add_listener(lambda event: job_runs.append(event.job_id), EVENT_JOB_EXECUTED)
+    sched.start()
+
+    stalls: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_stall_monitor(stalls, stop))
+
+    started = time.perf_counter()
+    fake.start_traffic(args.duration)
+    await asyncio.sleep(args.duration)
+    # No new job runs; give in-flight updates and jobs a moment to finish
+    sched.pause()
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    sched.shutdown(wait=False)
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    await http_client.close()
+    flush_state()
+
+    return {
+        "params": {
+            k: getattr(args, k)
+            for k in ("duration", "done_rate", "status_rate", "tasks_rate",
+                      "chats", "job_interval", "latency", "seed")
+        },
+        "updates_sent": fake.sent,
+        "updates_handled": len(handler_times),
+        "throughput_per_s": round(len(handler_times) / elapsed, 2),
+        "latency_ms": _ms(latencies),
+        "handler_ms": _ms(handler_times),
+        "loop_stall_ms": {
+            **_ms(stalls),
+            "total": round(sum(stalls) * 1000, 1),
+            "over_50ms": sum(1 for s in stalls if s > 0.05),
+        },
+        "scheduler_job_runs": len(job_runs),
+        "telegram_calls": {k: v for k, v in fake.servers.calls.items() if k.startswith("telegram.")},
+    }
+
+
+def _print_report(report: dict):
+    print(f"params {report['params']}")
+    print(
+        f"  updates   sent {report['updates_sent']}  handled {report['updates_handled']}  "
+        f"({report['throughput_per_s']}/s)  scheduler runs {report['scheduler_job_runs']}"
+    )
+    for name in ("latency_ms", "handler_ms", "loop_stall_ms"):
+        r = report[name]
+        print(
+            f"  {name:<13} p50 {r['p50']:8.2f}  p95 {r['p95']:8.2f}  "
+            f"p99 {r['p99']:8.2f}  max {r['max']:8.2f}"
+        )
+    print(
+        f"  loop stalled {report['loop_stall_ms']['total']} ms in total, "
+        f"{report['loop_stall_ms']['over_50ms']} ticks over 50 ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--done-rate", type=float, default=5, help="/done per second")
+    parser.add_argument("--status-rate", type=float, default=2, help="/status per second")
+    parser.add_argument("--tasks-rate", type=float, default=2, help="/tasks per second")
+    parser.add_argument("--chats", type=int, default=20, help="tenant chats sending commands")
+    parser.add_argument("--job-interval", type=float, default=30, help="seconds between scheduler job runs")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake API response")
+    parser.add_argument("--drain", type=float, default=2, help="seconds to wait for stragglers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON here")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's logs")
+    args = parser.parse_args()
+
+    owner = 1000
+    chats = [owner + i for i in range(1, args.chats + 1)]
+    servers = FakeServers(FakeConfig(latency=args.latency, chat_id=str(owner), seed=args.seed))
+    fake = FakeTelegramThread(servers, args, chats)
+    fake.start()
+    fake.ready.wait()
+
+    with tempfile.TemporaryDirectory(prefix="dgb-load-") as workdir:
+        # config.py reads the environment at import time, so set it first
+        _configure_env(workdir, fake.base_url, chats, owner)
+        try:
+            report = asyncio.run(run_load(args, fake))
+        finally:
+            fake.stop()
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Offline end-to-end benchmark for run.py.
+
+Starts the fake Telegram/Callmebot/GitHub servers from fake_servers.py, then
+runs run.py's main() in a fresh subprocess per iteration (so every run is a
+cold start, as in GitHub Actions) against a throwaway copy of the state.
+
+Reported per mode: wall time of main() and of the whole process, HTTP calls
+per endpoint, state.json reads and writes, and peak RSS. Results are written
+as JSON (bench/results/<commit>.json by default, ignored by git) so runs
+can be compared:
+
+    python bench/run_bench.py --runs 5 --latency 0.02
+    python bench/run_bench.py --compare bench/results/abc1234.json bench/results/def5678.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from fake_servers import FakeConfig, FakeServers, start
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ("notify", "summary")
+
+
+def _morning_tz() -> str:
+    """A POSIX TZ in which it is currently 08:xx, so notify runs the GitHub check."""
+    offset = (8 - datetime.now(timezone.utc).hour + 12) % 24 - 12
+    return f"BENCH{-offset:+d}"
+
+
+def _seed_state(path: str):
+    monday = date.today() - timedelta(days=date.today().weekday())
+    with open(path, "w") as f:
+        json.dump({
+            "start_date": monday.isoformat(),
+            "completed": {"1": [0]},
+            "seen_issues": [],
+            "notify_index": 0,
+        }, f)
+
+
+def _worker():
+    """Child process: run run.main() once and print measurements as JSON."""
+    import resource
+
+    sys.path.insert(0, ROOT)
+    import metrics
+    import run
+
+    start = time.perf_counter()
+    asyncio.run(run.main())
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "main_ms": elapsed * 1000,
+        "state_reads": metrics.state_load.count(),
+        "state_writes": metrics.state_save.count(),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+def _run_once(mode: str, base_url: str, workdir: str, chat_id: str) -> dict:
+    state_file = os.path.join(workdir, "state.json")
+    _seed_state(state_file)
+    env = {
+        **os.environ,
+        "RUN_MODE": mode,
+        "STATE_FILE": state_file,
+        "TENANT_STATE_DIR": os.path.join(workdir, "tenants"),
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": chat_id,
+        "CALLMEBOT_PHONE": "10000000000",
+        "CALLMEBOT_API_KEY": "bench",
+        "GITHUB_TOKEN": "bench",
+        "TELEGRAM_API_URL": base_url,
+        "CALLMEBOT_API_URL": base_url,
+        "GITHUB_API_URL": base_url,
+        "TZ": _morning_tz(),
+    }
+    env.pop("METRICS_FILE", None)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker"],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    process_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = process_ms
+    return result
+
+
+def _summarize(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median": round(statistics.median(ordered), 2),
+        "min": round(ordered[0], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+async def benchmark(args) -> dict:
+    config = FakeConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        pending_updates=args.updates,
+        issues_per_repo=args.issues,
+        seed=args.seed,
+    )
+    servers = FakeServers(config)
+    runner, base_url = await start(servers)
+    results = {}
+    try:
+        for mode in MODES:
+            runs = []
+            for _ in range(args.runs):
+                servers.reset()
+                workdir = tempfile.mkdtemp(prefix="dgb-bench-")
+                try:
+                    run = await asyncio.to_thread(
+                        _run_once, mode, base_url, workdir, config.chat_id
+                    )
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                run["http_calls"] = dict(servers.calls)
+                runs.append(run)
+            results[mode] = {
+                "main_ms": _summarize([r["main_ms"] for r in runs]),
+                "process_ms": _summarize([r["process_ms"] for r in runs]),
+                "http_calls": runs[-1]["http_calls"],
+                "state_reads": runs[-1]["state_reads"],
+                "state_writes": runs[-1]["state_writes"],
+                "peak_rss_kb": max(r["peak_rss_kb"] for r in runs),
+            }
+    finally:
+        await runner.cleanup()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {
+            "runs": args.runs,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "updates": args.updates,
+            "issues": args.issues,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_report(report: dict):
+    print(f"commit {report['commit']}  params {report['params']}")
+    for mode, r in report["results"].items():
+        calls = sum(r["http_calls"].values())
+        print(
+            f"  {mode:<8} main {r['main_ms']['median']:8.1f} ms  "
+            f"process {r['process_ms']['median']:8.1f} ms  "
+            f"http {calls:3d}  reads {r['state_reads']}  writes {r['state_writes']}  "
+            f"rss {r['peak_rss_kb'] / 1024:.1f} MB"
+        )
+
+
+def _compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["params"] != new["params"]:
+        print(f"warning: params differ: {old['params']} vs {new['params']}")
+    print(f"{old['commit']} -> {new['commit']}")
+    for mode in MODES:
+        a, b = old["results"].get(mode), new["results"].get(mode)
+        if not a or not b:
+            continue
+        for metric in ("main_ms", "process_ms"):
+            before, after = a[metric]["median"], b[metric]["median"]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"  {mode:<8} {metric:<11} {before:8.1f} -> {after:8.1f} ms ({change:+.1f}%)")
+        for metric in ("state_reads", "state_writes", "peak_rss_kb"):
+            print(f"  {mode:<8} {metric:<11} {a[metric]} -> {b[metric]}")
+        print(
+            f"  {mode:<8} http_calls  {sum(a['http_calls'].values())} -> "
+            f"{sum(b['http_calls'].values())}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="iterations per mode")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance of an injected error")
+    parser.add_argument("--updates", type=int, default=3, help="pending /done messages")
+    parser.add_argument("--issues", type=int, default=3, help="fake issues per repo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default bench/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker()
+        return
+    if args.compare:
+        _compare(*args.compare)
+        return
+
+    report = asyncio.run(benchmark(args))
+    _print_report(report)
+    output = args.output or os.path.join(ROOT, "bench", "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Chat commands, shared by bot.py (python-telegram-bot handlers) and run.py
+(the getUpdates backlog). handle() parses a message and routes it through
+ROUTES; every handler is a plain function returning the reply text.
+
+Replies that only depend on a chat's week — /status, /tasks and the
+scheduler's reminder and end-of-day summary — are rendered once per
+WeekView.key and reused until a completion, the week or the task text
+changes. The functions here do state I/O: on an event loop, call them via
+state.run_locked.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from state import (
+    get_current_week,
+    get_completed_tasks,
+    mark_task_done,
+    tasks_changed_since_completion,
+)
+from tasks import EDITED_WEEK_NOTE
+import tenants
+
+# Rendered views kept (a few per active chat and week)
+VIEW_CACHE_SIZE = 256
+
+HELP_TEXT = (
+    "*Commands:*\n\n"
+    "/done <number> — Mark task complete (e.g. /done 3)\n"
+    "/status — Current week progress\n"
+    "/tasks — List all tasks this week\n"
+    "/week — Show current week and month\n"
+    "/help — This message"
+)
+
+
+@dataclass(frozen=True)
+class WeekView:
+    """Everything a week's replies are rendered from."""
+
+    week: int
+    tasks: tuple[str, ...]
+    week_hash: str  # content hash of the week's tasks (changes with the catalog)
+    completed: frozenset[int]
+    edited: bool  # tasks changed after completions were recorded
+
+    @property
+    def key(self) -> tuple:
+        return (self.week, self.week_hash, self.completed, self.edited)
+
+    def incomplete(self) -> list[tuple[int, str]]:
+        return [(i, t) for i, t in enumerate(self.tasks) if i not in self.completed]
+
+
+def week_view(chat_id: str) -> WeekView:
+    week = get_current_week(chat_id)
+    week_hash = tenants.week_hash_for(chat_id, week)
+    return WeekView(
+        week=week,
+        tasks=tuple(tenants.tasks_for(chat_id, week)),
+        week_hash=week_hash,
+        completed=frozenset(get_completed_tasks(week, chat_id)),
+        edited=tasks_changed_since_completion(week, week_hash, chat_id),
+    )
+
+
+_views: OrderedDict[tuple, str] = OrderedDict()
+
+
+def _cached(render, view: WeekView, *args) -> str:
+    key = (render.__name__, view.key, args)
+    text = _views.get(key)
+    if text is None:
+        text = _views[key] = render(view, *args)
+        if len(_views) > VIEW_CACHE_SIZE:
+            _views.popitem(last=False)
+    else:
+        _views.move_to_end(key)
+    return text
+
+
+# -- Views --
+
+
+def _status(view: WeekView) -> str:
+    lines = [f"*Week {view.week} — {len(view.completed)}/{len(view.tasks)} complete*\n"]
+    for i, task in enumerate(view.tasks):
+        status = "done" if i in view.completed else "TODO"
+        lines.append(f"  {i + 1}. [{status}] {task}")
+    if view.edited:
+        lines.append(EDITED_WEEK_NOTE)
+    return "\n".join(lines)
+
+
+def _task_list(view: WeekView) -> str:
+    lines = [f"*Week {view.week} Tasks:*\n"]
+    for i, task in enumerate(view.tasks):
+        marker = "[x]" if i in view.completed else "[ ]"
+        lines.append(f"{i + 1}. {marker} {task}")
+    if view.edited:
+        lines.append(EDITED_WEEK_NOTE)
+    return "\n".join(lines)
+
+
+def _reminder(view: WeekView, task_idx: int | None) -> str:
+    if task_idx is None:
+        return (
+            f"*Week {view.week} — ALL TASKS COMPLETE*\n\n"
+            f"Everything done. Next week's tasks load automatically.\n"
+            f"Rest up or get ahead."
+        )
+    total = len(view.tasks)
+    return (
+        f"*Task {task_idx + 1}/{total} — INCOMPLETE*\n\n"
+        f"{view.tasks[task_idx]}\n\n"
+        f"Progress: {len(view.completed)}/{total} done (Week {view.week})\n"
+        f"Reply /done {task_idx + 1} when finished."
+    )
+
+
+def _summary(view: WeekView) -> str:
+    incomplete = view.incomplete()
+    if not incomplete:
+        return (
+            f"*End of Day — Week {view.week}*\n\n"
+            f"All {len(view.tasks)} tasks complete. Solid work."
+        )
+    remaining = "\n".join(f"  {i + 1}. {t}" for i, t in incomplete)
+    return (
+        f"*End of Day — Week {view.week}*\n\n"
+        f"Done: {len(view.tasks) - len(incomplete)}/{len(view.tasks)}\n\n"
+        f"Still incomplete:\n{remaining}\n\n"
+        f"These will keep coming until you finish them."
+    )
+
+
+def status_text(view: WeekView) -> str:
+    return _cached(_status, view)
+
+
+def tasks_text(view: WeekView) -> str:
+    return _cached(_task_list, view)
+
+
+def reminder_text(view: WeekView, task_idx: int | None) -> str:
+    """A reminder about one incomplete task (None = the all-done message)."""
+    return _cached(_reminder, view, task_idx)
+
+
+def summary_text(view: WeekView) -> str:
+    return _cached(_summary, view)
+
+
+# -- Commands: (chat_id, args) -> reply --
+
+
+def cmd_done(chat_id: str, args: list[str]) -> str:
+    """Mark a task as complete. Usage: /done 3"""
+    if not args:
+        return "Usage: /done <number>\nExample: /done 3"
+    try:
+        task_num = int(args[0])
+    except ValueError:
+        return "Task number must be a number. Example: /done 3"
+
+    view = week_view(chat_id)
+    task_index = task_num - 1  # Convert to 0-based
+    if not 0 <= task_index < len(view.tasks):
+        return f"Invalid task number. This week has tasks 1-{len(view.tasks)}."
+
+    if not mark_task_done(view.week, task_index, view.week_hash, chat_id=chat_id):
+        return f"Task {task_num} was already marked done."
+
+    remaining = len(view.tasks) - len(view.completed | {task_index})
+    if remaining == 0:
+        return (
+            f"*Task {task_num} — DONE*\n\n"
+            f"'{view.tasks[task_index]}'\n\n"
+            f"*ALL TASKS COMPLETE FOR WEEK {view.week}.*\n"
+            f"Next week's tasks load automatically."
+        )
+    return (
+        f"*Task {task_num} — DONE*\n\n"
+        f"'{view.tasks[task_index]}'\n\n"
+        f"{remaining} task{'s' if remaining != 1 else ''} remaining this week."
+    )
+
+
+def cmd_status(chat_id: str, args: list[str]) -> str:
+    """Show current week progress."""
+    return status_text(week_view(chat_id))
+
+
+def cmd_tasks(chat_id: str, args: list[str]) -> str:
+    """Show all tasks for current week."""
+    return tasks_text(week_view(chat_id))
+
+
+def cmd_week(chat_id: str, args: list[str]) -> str:
+    """Show what week you're on and overall month."""
+    week = get_current_week(chat_id)
+    month = ((week - 1) // 4) + 1
+    return (
+        f"*Week {week} (Month {month})*\n\n"
+        f"Use /tasks to see this week's list.\n"
+        f"Use /status for progress."
+    )
+
+
+def cmd_help(chat_id: str, args: list[str]) -> str:
+    """Show available commands."""
+    return HELP_TEXT
+
+
+def cmd_start(chat_id: str, args: list[str]) -> str:
+    """First interaction: register the chat if signup is open."""
+    if tenants.can_register(chat_id):
+        tenants.register(chat_id)
+    elif not tenants.is_tenant(chat_id):
+        # Still answer, so the user can find their chat ID
+        return (
+            f"Your chat ID: `{chat_id}`\n\n"
+            f"Set this as TELEGRAM_CHAT_ID in your environment."
+        )
+
+    view = week_view(chat_id)
+    return "\n".join([
+        "*Daily Grind Bot — Active*\n",
+        f"Week {view.week} loaded. {len(view.tasks)} tasks.\n",
+        "You'll get 6 reminders daily until every task is marked done.\n",
+        "*Commands:*",
+        "/done <number> — Mark task complete",
+        "/status — Progress",
+        "/tasks — This week's list",
+        "/help — All commands",
+    ])
+
+
+ROUTES = {
+    "/start": cmd_start,
+    "/done": cmd_done,
+    "/status": cmd_status,
+    "/tasks": cmd_tasks,
+    "/week": cmd_week,
+    "/help": cmd_help,
+}
+
+# Commands anyone may send; the rest are for tenants only
+PUBLIC_COMMANDS = {"/start"}
+
+
+def handle(text: str, chat_id: str) -> str | None:
+    """Run one chat message. Returns the reply, or None to stay silent."""
+    parts = text.strip().split()
+    if not parts:
+        return None
+    # "/done@SomeBot 3" in group chats
+    command = parts[0].split("@", 1)[0].lower()
+    handler = ROUTES.get(command)
+    if handler is None:
+        return None
+    if command not in PUBLIC_COMMANDS and not tenants.is_tenant(chat_id):
+        return None
+    return handler(chat_id, parts[1:])
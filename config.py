@@ -3,13 +3,71 @@ import os
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Multi-tenant mode: besides TELEGRAM_CHAT_ID (the owner, whose state stays in
+# STATE_FILE), every chat in TENANT_CHAT_IDS — or, with TENANT_OPEN_SIGNUP,
+# any chat that sends /start — gets its own state file in TENANT_STATE_DIR
+# with its own start date and roadmap (tasks file)
+MULTI_TENANT = os.getenv("MULTI_TENANT", "").lower() in ("1", "true", "yes")
+TENANT_CHAT_IDS = [c.strip() for c in os.getenv("TENANT_CHAT_IDS", "").split(",") if c.strip()]
+TENANT_OPEN_SIGNUP = os.getenv("TENANT_OPEN_SIGNUP", "").lower() in ("1", "true", "yes")
+TENANT_STATE_DIR = os.getenv("TENANT_STATE_DIR", "tenants")
+TENANT_CONCURRENCY = int(os.getenv("TENANT_CONCURRENCY", "20"))  # chats notified at once
+
+# Webhook mode for main.py: set TELEGRAM_WEBHOOK_URL to this service's public
+# base URL (e.g. https://daily-grind-bot.onrender.com) to receive updates on
+# the health server instead of long-polling. Without a configured secret a
+# random one is generated at startup.
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_PATH = "/telegram/webhook"
+
+# Read API on main.py's web server (/api/state, /api/tasks). With API_TOKEN
+# set, requests must send "Authorization: Bearer <token>".
+API_TOKEN = os.getenv("API_TOKEN", "")
+API_REFRESH_INTERVAL = int(os.getenv("API_REFRESH_INTERVAL", "30"))  # seconds between disk checks
+
+# run.py writes its metrics here at the end of each run ("-" = stderr)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
 
 # WhatsApp (Callmebot)
 CALLMEBOT_PHONE = os.getenv("CALLMEBOT_PHONE")  # with country code, e.g. 2348012345678
 CALLMEBOT_API_KEY = os.getenv("CALLMEBOT_API_KEY")
+CALLMEBOT_API_URL = os.getenv("CALLMEBOT_API_URL", "https://api.callmebot.com")
 
 # GitHub (optional, for issue alerts)
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+# Per-channel delivery deadline (seconds) for notify(); channels not listed
+# get NOTIFY_DEFAULT_DEADLINE
+NOTIFY_DEADLINES = {"telegram": 20, "whatsapp": 40}
+NOTIFY_DEFAULT_DEADLINE = 30
+
+# Per-destination send rate (messages/second, burst) and maximum message
+# length per channel; longer messages are split into ordered chunks
+CHANNEL_RATES = {"telegram": (1.0, 3), "whatsapp": (0.2, 1)}
+# Bot-wide send rate per channel across all destinations
+CHANNEL_GLOBAL_RATES = {"telegram": (30.0, 30)}
+CHANNEL_MESSAGE_LIMITS = {"telegram": 4096, "whatsapp": 1000}
+
+# Outbox: failed notifications are retried with exponential backoff (seconds)
+# and moved to the dead-letter list after OUTBOX_MAX_ATTEMPTS tries
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = 30
+OUTBOX_BACKOFF_MAX = 3600
+OUTBOX_SENT_TTL = 2 * 86400  # how long delivered idempotency keys are remembered
+
+# Shared HTTP client: per-host connection pool limits and timeouts (seconds)
+HTTP_HOSTS = {
+    TELEGRAM_API_URL: {"max_connections": 10, "keepalive": 5, "timeout": 15},
+    CALLMEBOT_API_URL: {"max_connections": 2, "keepalive": 1, "timeout": 30},
+    GITHUB_API_URL: {"max_connections": 10, "keepalive": 5, "timeout": 15},
+}
+HTTP_DEFAULT_TIMEOUT = 15
+HTTP_KEEPALIVE_EXPIRY = 30  # seconds an idle connection is kept open
+HTTP2 = os.getenv("HTTP2", "").lower() in ("1", "true", "yes")  # needs the h2 package
 
 # Timezone
 TIMEZONE = "Africa/Lagos"  # WAT (UTC+1)
@@ -20,9 +78,30 @@ START_DATE = os.getenv("START_DATE", "2025-02-03")
 # Notification times (24h format, WAT)
 NOTIFY_HOURS = [7, 10, 13, 16, 19, 22]
 
+# GitHub issue poll times (24h format, WAT); main.py runs the poll as its own
+# job, a few minutes past the hour, so it never delays a reminder
+ISSUE_POLL_HOURS = [int(h) for h in os.getenv("ISSUE_POLL_HOURS", "10").split(",") if h.strip()]
+
+# main.py still runs a job that starts up to this many seconds late. After a
+# restart, any slot missed within this window is run once to catch up.
+SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", "3600"))
+
 # State file path (lives in repo, committed by GitHub Actions)
 STATE_FILE = os.getenv("STATE_FILE", "state.json")
 
+# State storage backend: "json" or "sqlite". Empty = infer from STATE_FILE's
+# extension (.db / .sqlite / .sqlite3 mean SQLite)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "").lower()
+
+# Seconds main.py waits after a state change before writing it to disk
+STATE_FLUSH_DELAY = float(os.getenv("STATE_FLUSH_DELAY", "2"))
+
+# Journaled persistence: append mutations to STATE_FILE + ".journal" and fold
+# them into the snapshot once the log passes a size or age threshold
+STATE_JOURNAL = os.getenv("STATE_JOURNAL", "").lower() in ("1", "true", "yes")
+STATE_JOURNAL_MAX_BYTES = int(os.getenv("STATE_JOURNAL_MAX_BYTES", "65536"))
+STATE_JOURNAL_MAX_AGE = int(os.getenv("STATE_JOURNAL_MAX_AGE", "86400"))  # seconds
+
 # Target repos for issue alerts
 TARGET_REPOS = [
     "Uniswap/v4-core",
@@ -34,3 +113,24 @@ TARGET_REPOS = [
 ]
 
 ISSUE_LABELS = ["good first issue", "help wanted", "documentation"]
+
+# Issue polling: max GitHub requests in flight, and the overall time budget
+# (seconds) for one check — whatever finished by then is used
+GITHUB_CONCURRENCY = int(os.getenv("GITHUB_CONCURRENCY", "6"))
+GITHUB_DEADLINE = float(os.getenv("GITHUB_DEADLINE", "30"))
+
+# How issues are queried:
+#   "per_label" — one issues listing per (repo, label)
+#   "per_repo"  — one issues listing per repo, labels matched client-side
+#   "search"    — one search/issues query covering all repos and labels
+GITHUB_QUERY_STRATEGY = os.getenv("GITHUB_QUERY_STRATEGY", "per_repo")
+GITHUB_MAX_PAGES = int(os.getenv("GITHUB_MAX_PAGES", "5"))  # per query
+
+# Requests to keep in hand when planning a poll against the GitHub rate limit.
+# Queries that don't fit are deferred to the next slot.
+GITHUB_BUDGET_RESERVE = int(os.getenv("GITHUB_BUDGET_RESERVE", "5"))
+
+# Conditional-request cache for GitHub polling (ETag / Last-Modified),
+# stored in the bot state so it survives stateless GitHub Actions runs
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "50"))
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", str(7 * 86400)))  # seconds
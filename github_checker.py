@@ -1,75 +1,360 @@
 """
 Check target repos for new 'good first issue' / 'help wanted' issues.
+
+Polls are incremental: each query resumes from its cursor (issue_cursors.py)
+and pages back only as far as the newest issue it saw last time.
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 
 import httpx
 
-from config import GITHUB_TOKEN, TARGET_REPOS, ISSUE_LABELS
-from state import is_issue_seen, add_seen_issue
+from config import (
+    GITHUB_TOKEN,
+    GITHUB_API_URL,
+    TARGET_REPOS,
+    ISSUE_LABELS,
+    GITHUB_CONCURRENCY,
+    GITHUB_DEADLINE,
+    GITHUB_QUERY_STRATEGY,
+    GITHUB_MAX_PAGES,
+)
+from http_cache import ResponseCache, cache_key
+from http_client import get_client
+from issue_cursors import IssueCursors, item_key
+import metrics
+from rate_budget import RateBudget
+from state import is_issue_seen, add_seen_issue, run_locked
 
 logger = logging.getLogger(__name__)
 
+# GitHub rejects search queries longer than this
+SEARCH_QUERY_LIMIT = 256
+
+
+def _to_issue(item: dict, repo: str) -> dict:
+    return {
+        "repo": repo,
+        "title": item["title"],
+        "url": item["html_url"],
+        "labels": [l["name"] for l in item.get("labels", [])],
+    }
+
+
+def _repo_from_api_url(repository_url: str) -> str:
+    """'https://api.github.com/repos/owner/name' -> 'owner/name'"""
+    return "/".join(repository_url.rstrip("/").split("/")[-2:])
+
+
+def _has_wanted_label(item: dict) -> bool:
+    wanted = {label.lower() for label in ISSUE_LABELS}
+    return any(l["name"].lower() in wanted for l in item.get("labels", []))
 
-async def check_new_issues() -> list[dict]:
+
+def _build_queries(since_for) -> list[dict]:
+    """
+    Turn GITHUB_QUERY_STRATEGY into a list of queries.
+    Each query is {"name", "url", "params", "repo", "repos", "resource",
+    "filter"} where repo is None for search queries (the repo comes from each
+    result instead) and resource is the rate-limit bucket the query draws on.
+
+    since_for(name) gives each query's lower time bound as
+    "YYYY-MM-DDTHH:MM:SSZ" (its cursor, or the default window).
+    """
+    def listing(name: str) -> dict:
+        return {
+            "state": "open",
+            "since": since_for(name),
+            "sort": "created",
+            "direction": "desc",
+            "per_page": 100,
+        }
+
+    if GITHUB_QUERY_STRATEGY == "per_label":
+        return [
+            {
+                "name": f"{repo} ({label})",
+                "url": f"{GITHUB_API_URL}/repos/{repo}/issues",
+                "params": {**listing(f"{repo} ({label})"), "labels": label},
+                "repo": repo,
+                "repos": [repo],
+                "resource": "core",
+                "filter": None,
+            }
+            for repo in TARGET_REPOS
+            for label in ISSUE_LABELS
+        ]
+
+    if GITHUB_QUERY_STRATEGY == "per_repo":
+        return [
+            {
+                "name": repo,
+                "url": f"{GITHUB_API_URL}/repos/{repo}/issues",
+                "params": listing(repo),
+                "repo": repo,
+                "repos": [repo],
+                "resource": "core",
+                "filter": _has_wanted_label,
+            }
+            for repo in TARGET_REPOS
+        ]
+
+    if GITHUB_QUERY_STRATEGY == "search":
+        labels = ",".join(f'"{label}"' for label in ISSUE_LABELS)
+
+        def fixed(since: str) -> str:
+            return f"is:issue is:open label:{labels} updated:>={since}"
+
+        # Pack as many repo: qualifiers into each query as the length limit
+        # allows (every timestamp has the same length, so any one will do)
+        batches: list[list[str]] = [[]]
+        for repo in TARGET_REPOS:
+            candidate = batches[-1] + [repo]
+            q = fixed("0000-00-00T00:00:00Z") + "".join(f" repo:{r}" for r in candidate)
+            if batches[-1] and len(q) > SEARCH_QUERY_LIMIT:
+                batches.append([repo])
+            else:
+                batches[-1] = candidate
+        return [
+            {
+                "name": f"search ({', '.join(batch)})",
+                "url": f"{GITHUB_API_URL}/search/issues",
+                "params": {
+                    "q": fixed(since_for(f"search ({', '.join(batch)})"))
+                    + "".join(f" repo:{r}" for r in batch),
+                    "sort": "created",
+                    "order": "desc",
+                    "per_page": 100,
+                },
+                "repo": None,
+                "repos": batch,
+                "resource": "search",
+                "filter": None,
+            }
+            for batch in batches
+            if batch
+        ]
+
+    raise ValueError(f"Unknown GITHUB_QUERY_STRATEGY: {GITHUB_QUERY_STRATEGY!r}")
+
+
+def _slim(item: dict) -> dict:
+    """Keep only the fields we use, so cached pages stay small."""
+    slim = {
+        "title": item["title"],
+        "html_url": item["html_url"],
+        "labels": [{"name": l["name"]} for l in item.get("labels", [])],
+        "created_at": item.get("created_at"),
+        "updated_at": item.get("updated_at"),
+        "number": item.get("number"),
+    }
+    if "repository_url" in item:
+        slim["repository_url"] = item["repository_url"]
+    if "pull_request" in item:
+        slim["pull_request"] = True
+    return slim
+
+
+async def _get_page(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    cache: ResponseCache,
+    budget: RateBudget,
+    query: dict,
+    url: str,
+    params: dict | None,
+    headers: dict,
+) -> dict | None:
+    """
+    Fetch one page as {"items": [...], "next": url-or-None}, revalidating
+    against the cache. Returns None on an error response or when the rate
+    limit budget is spent.
+    """
+    key = cache_key(url, params)
+    async with sem:
+        if not budget.acquire(query["resource"]):
+            logger.warning(f"GitHub budget spent — stopping {query['name']} early")
+            return None
+        with metrics.github_latency.time(query["repo"] or query["name"]):
+            resp = await client.get(
+                url,
+                headers={**headers, **cache.conditional_headers(key)},
+                params=params,
+            )
+    metrics.github_responses.inc(query["repo"] or query["name"], resp.status_code)
+    budget.update(
+        query["resource"],
+        resp.status_code,
+        resp.headers,
+        resp.text if resp.status_code == 403 else "",
+    )
+    if resp.status_code == 304:
+        return cache.hit(key)
+    if resp.status_code != 200:
+        logger.warning(
+            f"GitHub API {resp.status_code} for {query['name']}: {resp.text[:200]}"
+        )
+        return None
+
+    data = resp.json()
+    items = data["items"] if query["repo"] is None else data
+    page = {
+        "items": [_slim(item) for item in items],
+        "next": resp.links.get("next", {}).get("url"),
+    }
+    cache.store(key, resp.headers, page)
+    return page
+
+
+async def _run_query(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    cache: ResponseCache,
+    budget: RateBudget,
+    query: dict,
+    headers: dict,
+    cursors: IssueCursors,
+) -> list[dict]:
+    """
+    Run one query, following Link: rel="next" until it reaches the query's
+    cursor (at most GITHUB_MAX_PAGES pages). Stages the new cursor if the
+    query ran to completion.
+    """
+    issues = []
+    url, params = query["url"], query["params"]
+    name = query["name"]
+    newest = None
+    first_poll = cursors.since(name) is None
+    complete = False
+
+    try:
+        for _ in range(GITHUB_MAX_PAGES):
+            page = await _get_page(
+                client, sem, cache, budget, query, url, params, headers
+            )
+            if page is None:
+                break
+
+            reached_cursor = False
+            for item in page["items"]:
+                if cursors.is_new(name, item):
+                    newest = max(newest or item_key(item), item_key(item))
+                else:
+                    # Newest first, so everything from here on is old. Finish
+                    # the page for issues labelled since the last poll.
+                    reached_cursor = True
+                    if not cursors.updated_since_poll(name, item):
+                        continue
+                # Skip PRs (GitHub API returns PRs in issues endpoint)
+                if "pull_request" in item:
+                    continue
+                if query["filter"] and not query["filter"](item):
+                    continue
+                repo = query["repo"] or _repo_from_api_url(item["repository_url"])
+                issues.append(_to_issue(item, repo))
+
+            if reached_cursor or not page["next"]:
+                complete = True
+                break
+            # The next link already carries every query parameter
+            url, params = page["next"], None
+        else:
+            # Out of pages: fine for a first poll (the window is a
+            # best-effort backfill), otherwise retry from the old cursor
+            complete = first_poll
+    except Exception as e:
+        logger.error(f"GitHub check failed for {query['name']}: {e}")
+
+    if complete:
+        cursors.advance(name, newest)
+    return issues
+
+
+async def check_new_issues(cursors: IssueCursors | None = None) -> list[dict]:
     """
     Check target repos for new issues with relevant labels.
     Returns list of {"repo", "title", "url", "labels"} dicts.
+
+    Pass an IssueCursors to defer the bookkeeping until the alert is
+    delivered: the issues stay unseen and the cursors unsaved, and the
+    caller queues the alert with both as its outbox state_updates (see
+    scheduler.check_issues). Without one, both happen right away.
+
+    Queries (see GITHUB_QUERY_STRATEGY) run concurrently, at most
+    GITHUB_CONCURRENCY requests at a time. When the rate-limit budget is low
+    only the highest-priority queries run; the rest wait for the next slot.
+    Queries still running after GITHUB_DEADLINE seconds are cancelled and
+    the issues gathered so far are returned.
     """
-    new_issues = []
     headers = {"Accept": "application/vnd.github.v3+json"}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
 
-    # Look at issues from the last 24 hours
-    since = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
+    # A query without a cursor looks at issues from the last 24 hours. The
+    # window start is rounded down to midnight UTC so request URLs stay
+    # identical across a day's runs and the conditional-request cache can
+    # answer them.
+    window = (datetime.now(timezone.utc) - timedelta(hours=24)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ).strftime("%Y-%m-%dT%H:%M:%SZ")
+    save_cursors = cursors is None
+    cursors = cursors or await run_locked(None, IssueCursors.load)
+    cache = await run_locked(None, ResponseCache.load)
+    budget = await run_locked(None, RateBudget.load)
+    queries = budget.plan(_build_queries(lambda name: cursors.since(name) or window))
 
-    async with httpx.AsyncClient() as client:
-        for repo in TARGET_REPOS:
-            for label in ISSUE_LABELS:
-                url = f"https://api.github.com/repos/{repo}/issues"
-                params = {
-                    "labels": label,
-                    "state": "open",
-                    "since": since,
-                    "sort": "created",
-                    "direction": "desc",
-                    "per_page": 5,
-                }
-
-                try:
-                    resp = await client.get(
-                        url, headers=headers, params=params, timeout=15
-                    )
-                    if resp.status_code != 200:
-                        logger.warning(
-                            f"GitHub API {resp.status_code} for {repo}: {resp.text[:200]}"
-                        )
-                        continue
+    client = get_client()
+    sem = asyncio.Semaphore(GITHUB_CONCURRENCY)
+    jobs = {
+        asyncio.create_task(
+            _run_query(client, sem, cache, budget, query, headers, cursors)
+        ): query
+        for query in queries
+    }
+    pending = set()
+    if jobs:
+        _, pending = await asyncio.wait(jobs, timeout=GITHUB_DEADLINE)
+    for job in pending:
+        logger.warning(f"GitHub check for {jobs[job]['name']} hit the deadline")
+        job.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
 
-                    issues = resp.json()
-                    for issue in issues:
-                        issue_url = issue["html_url"]
-                        # Skip PRs (GitHub API returns PRs in issues endpoint)
-                        if "pull_request" in issue:
-                            continue
-                        if not is_issue_seen(issue_url):
-                            add_seen_issue(issue_url)
-                            new_issues.append(
-                                {
-                                    "repo": repo,
-                                    "title": issue["title"],
-                                    "url": issue_url,
-                                    "labels": [
-                                        l["name"] for l in issue.get("labels", [])
-                                    ],
-                                }
-                            )
-                except Exception as e:
-                    logger.error(f"GitHub check failed for {repo}: {e}")
+    await run_locked(None, cache.save)
+    logger.info(f"GitHub cache: {cache.hits} not modified, {cache.misses} fetched")
 
+    # The same issue can come back from several queries — keep the first copy
+    found: dict[str, dict] = {}
+    for job in jobs:
+        if job in pending:
+            continue
+        for issue in job.result():
+            found.setdefault(issue["url"], issue)
+
+    return await run_locked(
+        None, _record_new, found, budget, cursors if save_cursors else None
+    )
+
+
+def _record_new(
+    found: dict[str, dict], budget: RateBudget, cursors: IssueCursors | None
+) -> list[dict]:
+    """Pick out unseen issues and persist the poll's bookkeeping.
+
+    With cursors (we loaded them ourselves) the issues are marked seen and
+    the cursors saved here; otherwise the caller does it on delivery.
+    """
+    new_issues = []
+    for issue_url, issue in found.items():
+        if not is_issue_seen(issue_url):
+            new_issues.append(issue)
+            budget.record_activity(issue["repo"])
+    budget.save()
+    if cursors is not None:
+        for issue in new_issues:
+            add_seen_issue(issue["url"])
+        cursors.save()
     return new_issues
 
 
@@ -0,0 +1,88 @@
+"""
+Conditional-request cache for GitHub polling.
+
+Stores the ETag / Last-Modified validators and a slimmed-down copy of the
+parsed payload per request URL + params. A 304 Not Modified answer is free
+(it doesn't count against the rate limit), and the cached payload stands in
+for the body. Entries live in the bot state under "http_cache".
+"""
+
+import time
+import urllib.parse
+
+from config import HTTP_CACHE_MAX_ENTRIES, HTTP_CACHE_MAX_AGE
+from state import get_state_value, set_state_value
+
+STATE_KEY = "http_cache"
+
+
+def cache_key(url: str, params: dict | None) -> str:
+    if not params:
+        return url
+    return f"{url}?{urllib.parse.urlencode(sorted(params.items()))}"
+
+
+class ResponseCache:
+    """ETag / Last-Modified cache keyed by request URL + params."""
+
+    def __init__(self, entries: dict | None = None):
+        # {key: {"etag", "last_modified", "payload", "stored_at", "used_at"}}
+        self.entries: dict[str, dict] = entries or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls) -> "ResponseCache":
+        return cls(dict(get_state_value(STATE_KEY, {}) or {}))
+
+    def save(self):
+        self.evict()
+        set_state_value(STATE_KEY, self.entries)
+
+    def conditional_headers(self, key: str) -> dict:
+        """Validators to send with the request, if we have a cached copy."""
+        entry = self.entries.get(key)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def hit(self, key: str):
+        """Return the cached payload after a 304 response."""
+        # Replace rather than edit the entry: load() only copies the outer
+        # dict, and the store's cached copy may be mid-write on the I/O thread
+        entry = self.entries[key] = {**self.entries[key], "used_at": time.time()}
+        self.hits += 1
+        return entry["payload"]
+
+    def store(self, key: str, headers, payload):
+        """Remember a 200 response's validators and (slimmed) payload."""
+        self.misses += 1
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            self.entries.pop(key, None)
+            return
+        now = time.time()
+        self.entries[key] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "payload": payload,
+            "stored_at": now,
+            "used_at": now,
+        }
+
+    def evict(self):
+        """Drop entries not used within HTTP_CACHE_MAX_AGE, then the least
+        recently used ones beyond HTTP_CACHE_MAX_ENTRIES."""
+        cutoff = time.time() - HTTP_CACHE_MAX_AGE
+        live = sorted(
+            (item for item in self.entries.items() if item[1]["used_at"] >= cutoff),
+            key=lambda item: item[1]["used_at"],
+            reverse=True,
+        )
+        self.entries = dict(live[:HTTP_CACHE_MAX_ENTRIES])
@@ -0,0 +1,94 @@
+"""
+Application-wide pooled HTTP client.
+
+One httpx.AsyncClient is shared by the notifier, the GitHub checker and
+run.py, so connections (and TLS sessions) to Telegram, Callmebot and GitHub
+are reused across calls. Each host in HTTP_HOSTS gets its own connection
+pool limits and default timeout. main.py and run.py call start()/close()
+around their lifetime; get_client() also creates the client on demand.
+"""
+
+import importlib.util
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import HTTP_HOSTS, HTTP_DEFAULT_TIMEOUT, HTTP_KEEPALIVE_EXPIRY, HTTP2
+
+logger = logging.getLogger(__name__)
+
+_client: "PooledClient | None" = None
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PooledClient(httpx.AsyncClient):
+    """AsyncClient that applies the per-host timeout unless one is given."""
+
+    def __init__(self, timeouts: dict[str, float], **kwargs):
+        super().__init__(**kwargs)
+        self._timeouts = timeouts
+
+    def build_request(self, method, url, *, timeout=httpx.USE_CLIENT_DEFAULT, **kwargs):
+        if timeout is httpx.USE_CLIENT_DEFAULT:
+            timeout = self._timeouts.get(_origin(url), HTTP_DEFAULT_TIMEOUT)
+        return super().build_request(method, url, timeout=timeout, **kwargs)
+
+
+def _http2_available() -> bool:
+    if not HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2 requested but the h2 package is not installed — using HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client() -> PooledClient:
+    http2 = _http2_available()
+    mounts = {}
+    timeouts = {}
+    for base_url, opts in HTTP_HOSTS.items():
+        origin = _origin(base_url)
+        mounts[origin] = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=opts.get("max_connections"),
+                max_keepalive_connections=opts.get("keepalive"),
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        timeouts[origin] = opts.get("timeout", HTTP_DEFAULT_TIMEOUT)
+
+    return PooledClient(
+        timeouts,
+        http2=http2,
+        mounts=mounts,
+        limits=httpx.Limits(keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        timeout=HTTP_DEFAULT_TIMEOUT,
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if needed."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start():
+    """Open the shared client (call once at process start)."""
+    get_client()
+
+
+async def close():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,87 @@
+"""
+Per-query high-water marks for the GitHub issue poll.
+
+Every query (see github_checker._build_queries) lists issues newest first.
+Its cursor is the (created_at, number) of the newest issue it has seen.
+The next poll passes the cursor's created_at as the (update time) filter
+and stops paging once it reaches the cursor. Items above the cursor are
+new. On the page where it reaches the cursor, older items that were updated
+since the previous poll (polled_at) are kept as well: an issue that gets a
+wanted label during triage is newly relevant. The seen set drops the ones
+already alerted. Such items on later pages are not fetched, so a triage
+burst of more than a page between two polls can still miss some. The cost
+of a poll tracks the number of new and updated issues, not the window size.
+
+Cursors move in two steps:
+- advance() stages a new mark for a query that reached its cursor or ran
+  out of pages. A query that was cut short is not staged, so no issue is
+  skipped.
+- save() writes the staged marks. The caller only calls it once the alert
+  for those issues has been delivered.
+Cursors live in the bot state under "issue_cursors".
+"""
+
+from datetime import datetime, timezone
+
+from state import get_state_value, set_state_value
+
+STATE_KEY = "issue_cursors"
+
+
+def item_key(item: dict) -> tuple[str, int]:
+    """Sort key matching GitHub's created-desc order (ISO times sort as text)."""
+    return (item.get("created_at") or "", item.get("number") or 0)
+
+
+class IssueCursors:
+    """{query name: {"created_at", "number", "polled_at"}}, plus staged updates."""
+
+    def __init__(self, marks: dict | None = None):
+        self.marks: dict[str, dict] = marks or {}
+        self.staged: dict[str, dict] = {}
+        # Start of this poll: the next one keeps items updated after it
+        self.polled_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    @classmethod
+    def load(cls) -> "IssueCursors":
+        return cls(dict(get_state_value(STATE_KEY, {}) or {}))
+
+    def save(self):
+        """Persist staged cursors (call after the alert went out)."""
+        if not self.staged:
+            return
+        self.marks.update(self.staged)
+        self.staged = {}
+        set_state_value(STATE_KEY, self.marks)
+
+    def since(self, name: str) -> str | None:
+        """created_at of the query's cursor, or None on its first poll."""
+        mark = self.marks.get(name)
+        return mark["created_at"] if mark else None
+
+    def is_new(self, name: str, item: dict) -> bool:
+        mark = self.marks.get(name)
+        if not mark:
+            return True
+        return item_key(item) > (mark["created_at"], mark["number"])
+
+    def updated_since_poll(self, name: str, item: dict) -> bool:
+        """True for an item below the cursor that changed since the last poll."""
+        mark = self.marks.get(name)
+        if not mark or not item.get("updated_at"):
+            return False
+        return item["updated_at"] >= mark.get("polled_at", mark["created_at"])
+
+    def advance(self, name: str, newest: tuple[str, int] | None):
+        """Stage the newest (created_at, number) a complete query saw, and
+        this poll's time."""
+        mark = self.marks.get(name)
+        if mark and (newest is None or newest <= (mark["created_at"], mark["number"])):
+            newest = (mark["created_at"], mark["number"])
+        if newest is None or not newest[0]:
+            return
+        self.staged[name] = {
+            "created_at": newest[0],
+            "number": newest[1],
+            "polled_at": self.polled_at,
+        }
@@ -1,21 +1,53 @@
 """
 Entry point: runs Telegram bot polling + APScheduler + health check web server.
-The health endpoint keeps Render from spinning down the free-tier service.
+The health endpoint keeps Render from spinning down the free-tier service; the
+same server exposes the read API from api.py.
+
+With TELEGRAM_WEBHOOK_URL set, the bot registers a webhook instead of
+long-polling and Telegram delivers updates to the same web server.
 """
 
 import asyncio
+import hmac
 import logging
 import os
+import secrets
+import signal
+from datetime import datetime, timedelta, timezone
 from aiohttp import web
 
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from telegram import Update
 
-from config import TIMEZONE, NOTIFY_HOURS
+from config import (
+    TIMEZONE,
+    NOTIFY_HOURS,
+    ISSUE_POLL_HOURS,
+    SCHEDULER_MISFIRE_GRACE,
+    STATE_FLUSH_DELAY,
+    TELEGRAM_WEBHOOK_URL,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_PATH,
+    API_REFRESH_INTERVAL,
+)
+import api
+import http_client
+import metrics
+import outbox
 from bot import build_app
-from scheduler import send_task_notification, send_status_summary
-from state import get_current_week, get_completed_tasks
-from tasks import get_tasks_for_week
+from scheduler import send_task_notification, send_status_summary, check_issues
+from state import (
+    get_store,
+    flush_state,
+    get_state_value,
+    set_state_value,
+    aget_state_value,
+    run_locked,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,22 +55,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# State key: {job id: ISO time of the latest scheduled run that happened}
+JOB_RUNS_KEY = "job_runs"
+
 
-async def health_handler(request):
-    """Health check endpoint — keeps Render from sleeping."""
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
-    done = len(get_completed_tasks(week))
-    return web.json_response({
-        "status": "ok",
-        "week": week,
-        "progress": f"{done}/{len(tasks)}",
-    })
+async def webhook_handler(request):
+    """Receive a Telegram update and hand it to the bot's handlers."""
+    expected = request.app["webhook_secret"]
+    given = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(given, expected):
+        return web.Response(status=403)
+
+    bot_app = request.app["bot_app"]
+    try:
+        update = Update.de_json(await request.json(), bot_app.bot)
+    except Exception as e:
+        logger.warning(f"Bad webhook payload: {e}")
+        return web.Response(status=400)
+    await bot_app.update_queue.put(update)
+    return web.Response()
+
+
+def record_job_lag(event):
+    """Observe how late each job fired compared to its scheduled time."""
+    now = datetime.now(timezone.utc)
+    for run_time in event.scheduled_run_times:
+        metrics.scheduler_lag.observe((now - run_time).total_seconds(), event.job_id)
 
 
 def setup_scheduler() -> AsyncIOScheduler:
-    """Configure APScheduler with notification jobs."""
-    sched = AsyncIOScheduler(timezone=TIMEZONE)
+    """
+    Configure APScheduler with notification jobs.
+
+    Every job coalesces missed runs into one, never overlaps itself and
+    still runs if it starts up to SCHEDULER_MISFIRE_GRACE seconds late.
+    """
+    sched = AsyncIOScheduler(
+        timezone=TIMEZONE,
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": SCHEDULER_MISFIRE_GRACE,
+        },
+    )
 
     for hour in NOTIFY_HOURS:
         if hour == NOTIFY_HOURS[-1]:
@@ -56,36 +115,100 @@ def setup_scheduler() -> AsyncIOScheduler:
                 name=f"Task notification ({hour}:00)",
             )
 
+    # GitHub polling runs on its own, so a slow poll can't hold up a reminder
+    for hour in ISSUE_POLL_HOURS:
+        sched.add_job(
+            check_issues,
+            CronTrigger(hour=hour, minute=5, timezone=TIMEZONE),
+            id=f"issue_poll_{hour}",
+            name=f"GitHub issue poll ({hour}:05)",
+        )
+
+    # Retry undelivered notifications
+    sched.add_job(
+        outbox.drain_all,
+        IntervalTrigger(minutes=1, timezone=TIMEZONE),
+        id="outbox_drain",
+        name="Outbox retry",
+    )
+
+    # Let the read API notice state.json / tasks.json edited on disk
+    sched.add_job(
+        api.refresh_job,
+        IntervalTrigger(seconds=API_REFRESH_INTERVAL, timezone=TIMEZONE),
+        id="api_refresh",
+        name="API snapshot refresh",
+    )
+
+    sched.add_listener(record_job_lag, EVENT_JOB_SUBMITTED)
+    sched.add_listener(
+        lambda event: record_job_run(sched, event), EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+    )
     return sched
 
 
+def record_job_run(sched: AsyncIOScheduler, event):
+    """Persist the latest run of each cron job, for catch_up_missed_runs().
+
+    Listeners run on the event loop, so the state I/O is handed to the state
+    thread.
+    """
+    job = sched.get_job(event.job_id)
+    if job is None or not isinstance(job.trigger, CronTrigger):
+        return
+    asyncio.ensure_future(
+        run_locked(None, _save_job_run, event.job_id, event.scheduled_run_time.isoformat())
+    )
+
+
+def _save_job_run(job_id: str, scheduled: str):
+    runs = dict(get_state_value(JOB_RUNS_KEY) or {})
+    runs[job_id] = scheduled
+    set_state_value(JOB_RUNS_KEY, runs)
+
+
+async def catch_up_missed_runs(sched: AsyncIOScheduler):
+    """
+    Run each cron job once, right away, if one of its slots came due while the
+    bot was down (within SCHEDULER_MISFIRE_GRACE). Jobs that have never run
+    here are left alone, so a first deploy doesn't fire everything at once.
+    """
+    runs = await aget_state_value(JOB_RUNS_KEY) or {}
+    now = datetime.now(timezone.utc)
+    earliest = now - timedelta(seconds=SCHEDULER_MISFIRE_GRACE)
+    for job in sched.get_jobs():
+        if not isinstance(job.trigger, CronTrigger) or job.id not in runs:
+            continue
+        since = max(datetime.fromisoformat(runs[job.id]), earliest)
+        missed = job.trigger.get_next_fire_time(None, since + timedelta(seconds=1))
+        if missed is not None and missed <= now:
+            logger.info(f"Catching up {job.name}, missed at {missed:%Y-%m-%d %H:%M}")
+            job.modify(next_run_time=now)
+
+
 async def main():
     logger.info("Starting Daily Grind Bot...")
 
+    # Batch state writes: flush a couple of seconds after the last change
+    get_store().flush_delay = STATE_FLUSH_DELAY
+
+    # Shared HTTP connection pool for notifications and GitHub polling
+    await http_client.start()
+
     # Build Telegram bot
     app = build_app()
 
     await app.initialize()
     await app.start()
 
-    await app.updater.start_polling(
-        drop_pending_updates=True,
-        connect_timeout=30,
-        read_timeout=30,
-        pool_timeout=30,
-    )
-    logger.info("Telegram bot polling started")
-
-    # Start scheduler
-    sched = setup_scheduler()
-    sched.start()
-    logger.info(f"Scheduler started — notifications at {NOTIFY_HOURS} ({TIMEZONE})")
-
     # Start health check web server (Render needs a port listener)
     port = int(os.getenv("PORT", 10000))
     web_app = web.Application()
-    web_app.router.add_get("/", health_handler)
-    web_app.router.add_get("/health", health_handler)
+    api.add_routes(web_app)
+    if TELEGRAM_WEBHOOK_URL:
+        web_app["bot_app"] = app
+        web_app["webhook_secret"] = TELEGRAM_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        web_app.router.add_post(TELEGRAM_WEBHOOK_PATH, webhook_handler)
 
     runner = web.AppRunner(web_app)
     await runner.setup()
@@ -93,17 +216,55 @@ async def main():
     await site.start()
     logger.info(f"Health server listening on port {port}")
 
-    # Keep running
+    if TELEGRAM_WEBHOOK_URL:
+        # The server is already listening, so Telegram can deliver right away
+        await app.bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=web_app["webhook_secret"],
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+        )
+        logger.info("Telegram webhook registered")
+    else:
+        await app.updater.start_polling(
+            drop_pending_updates=True,
+            connect_timeout=30,
+            read_timeout=30,
+            pool_timeout=30,
+        )
+        logger.info("Telegram bot polling started")
+
+    # Start scheduler
+    sched = setup_scheduler()
+    sched.start()
+    await catch_up_missed_runs(sched)
+    logger.info(f"Scheduler started — notifications at {NOTIFY_HOURS} ({TIMEZONE})")
+
+    # Keep running until SIGTERM (Render / Docker stop) or Ctrl-C. Python
+    # skips atexit handlers on SIGTERM, and under asyncio.run Ctrl-C arrives
+    # as cancellation, so the clean shutdown (and the last state flush)
+    # happens here.
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows: Ctrl-C still cancels us
+            pass
     try:
-        while True:
-            await asyncio.sleep(3600)
-    except (KeyboardInterrupt, SystemExit):
+        await stop.wait()
+    finally:
         logger.info("Shutting down...")
         sched.shutdown()
-        await runner.cleanup()
-        await app.updater.stop()
-        await app.stop()
-        await app.shutdown()
+        try:
+            await runner.cleanup()
+            if app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+            await app.shutdown()
+            await http_client.close()
+        finally:
+            flush_state()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts keyed by label values; recording one
+observation is a dict lookup, a bisect and two additions, and nothing is
+formatted until render() is called — by main.py's /metrics route or by
+run.py's end-of-run dump (METRICS_FILE).
+"""
+
+import bisect
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Seconds; covers everything from a cached state read to a slow Callmebot call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = super().render()
+        if not self._values and not self.label_names:
+            lines.append(f"{self.name} 0")
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # {labels: [per-bucket counts..., +Inf count, sum]}
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self):
+        lines = super().render()
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += n
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative:g}")
+            plain = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{plain} {series[-1]:g}")
+            lines.append(f"{self.name}_count{plain} {cumulative:g}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def dump(path: str):
+    """Write every metric to a file ("-" for stderr), e.g. at the end of run.py."""
+    if path == "-":
+        sys.stderr.write(render())
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+# -- The bot's metrics --
+
+notify_latency = Histogram(
+    "dgb_notify_seconds", "Time to deliver one message on a channel", ("channel",)
+)
+messages_sent = Counter(
+    "dgb_messages_sent_total", "Messages delivered, per channel", ("channel",)
+)
+messages_failed = Counter(
+    "dgb_messages_failed_total", "Failed delivery attempts, per channel", ("channel",)
+)
+messages_retried = Counter(
+    "dgb_messages_retried_total", "Outbox messages scheduled for another attempt"
+)
+messages_dead = Counter(
+    "dgb_messages_dead_total", "Outbox messages that ran out of attempts"
+)
+github_latency = Histogram(
+    "dgb_github_request_seconds", "GitHub API request latency", ("repo",)
+)
+github_responses = Counter(
+    "dgb_github_responses_total", "GitHub API responses by status code", ("repo", "status")
+)
+state_load = Histogram("dgb_state_load_seconds", "Time to read and parse a state file")
+state_save = Histogram("dgb_state_save_seconds", "Time to write pending state changes")
+scheduler_lag = Histogram(
+    "dgb_scheduler_lag_seconds",
+    "How late a scheduled job started versus its scheduled time",
+    ("job",),
+)
@@ -1,69 +1,319 @@
 """
 Send messages to Telegram and WhatsApp (Callmebot).
+
+Channels live in a registry: notify() sends to every configured channel at
+once, each under its own deadline, and reports how each delivery went. To
+add a channel, decorate its send function with @register_channel.
+
+Each destination has a token bucket (CHANNEL_RATES) that also honours the
+server's retry hints, and messages longer than CHANNEL_MESSAGE_LIMITS are
+split on line boundaries outside Markdown entities and sent in order. Each
+chunk gets the channel's full deadline, and a delivery that fails partway
+reports how many chunks arrived so a retry can resume after them.
 """
 
+import asyncio
+import dataclasses
+import functools
 import logging
+import time
 import urllib.parse
-
-import httpx
+from typing import Awaitable, Callable
 
 from config import (
     TELEGRAM_BOT_TOKEN,
     TELEGRAM_CHAT_ID,
+    TELEGRAM_API_URL,
     CALLMEBOT_PHONE,
     CALLMEBOT_API_KEY,
+    CALLMEBOT_API_URL,
+    NOTIFY_DEADLINES,
+    NOTIFY_DEFAULT_DEADLINE,
+    CHANNEL_RATES,
+    CHANNEL_GLOBAL_RATES,
+    CHANNEL_MESSAGE_LIMITS,
 )
+from http_client import get_client
+import metrics
 
 logger = logging.getLogger(__name__)
 
 
-async def send_telegram(text: str):
-    """Send a message via Telegram Bot API."""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        logger.warning("Telegram not configured — skipping")
-        return
+class DeliveryError(Exception):
+    """A channel accepted the request but did not deliver the message."""
+
+
+@dataclasses.dataclass
+class Channel:
+    name: str
+    send: Callable[[str], Awaitable[None]]  # sends one chunk
+    configured: Callable[[], bool]
+    deadline: float
+
+
+@dataclasses.dataclass
+class DeliveryResult:
+    channel: str
+    status: str  # "ok", "failed", "timeout" or "skipped" (not configured)
+    latency: float  # seconds
+    error: str | None = None
+    chunks_sent: int = 0  # chunks delivered so far, including skipped ones
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+CHANNELS: dict[str, Channel] = {}
+
+
+class TokenBucket:
+    """Allow `rate` sends per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Stop sending for `seconds` (server asked us to back off)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+
+
+def _bucket(channel: str, destination: str | None = None) -> TokenBucket:
+    """Per-destination bucket, or the channel-wide one if destination is None."""
+    key = (channel, destination)
+    if key not in _buckets:
+        if destination is None:
+            rate = CHANNEL_GLOBAL_RATES.get(channel, (1000.0, 1000))
+        else:
+            rate = CHANNEL_RATES.get(channel, (1.0, 1))
+        _buckets[key] = TokenBucket(*rate)
+    return _buckets[key]
+
+
+def _retry_after(resp) -> float:
+    """Seconds the server asked us to wait (Telegram puts it in the body)."""
+    try:
+        return float(resp.json()["parameters"]["retry_after"])
+    except Exception:
+        pass
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return 1.0
+
+
+def _cut_points(text: str, limit: int) -> tuple[int, int]:
+    """
+    Last line break and last space within `limit` that sit outside any
+    Markdown entity (*bold*, _italic_, `code`, [text](url)). Positions are
+    where the next chunk would start; 0 means none found.
+
+    An entity left open at a line break is treated as closed there, so a
+    stray * or _ can't block every later cut; code (`) may span lines. An
+    underscore inside a word (snake_case) doesn't open an entity.
+    """
+    line = space = 0
+    open_entity = None  # closing character we're waiting for
+    for i, ch in enumerate(text[:limit]):
+        if ch == "\n" and open_entity not in (None, "`"):
+            open_entity = None
+        if open_entity is None:
+            if ch == "_" and _in_word(text, i):
+                continue
+            if ch in "*_`":
+                open_entity = ch
+            elif ch == "[":
+                open_entity = "]"
+            elif ch == "\n":
+                line = i + 1
+            elif ch == " ":
+                space = i + 1
+        elif ch == open_entity:
+            if ch == "]" and text[i + 1 : i + 2] == "(":
+                open_entity = ")"
+            else:
+                open_entity = None
+    return line, space
+
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+def _in_word(text: str, i: int) -> bool:
+    return 0 < i < len(text) - 1 and text[i - 1].isalnum() and text[i + 1].isalnum()
+
+
+def split_message(text: str, limit: int) -> list[str]:
+    """Split text into chunks of at most `limit` characters, preferring line
+    breaks, then spaces, and never cutting inside a Markdown entity unless a
+    single entity is longer than `limit`. Blank chunks are dropped (Telegram
+    rejects empty messages)."""
+    chunks = []
+    while len(text) > limit:
+        line, space = _cut_points(text, limit)
+        cut = line or space or limit
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip("\n")
+    chunks.append(text)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def register_channel(name: str, configured: Callable[[], bool]):
+    """Register a coroutine `send(chunk)` as a notification channel.
+
+    deliver() splits messages by CHANNEL_MESSAGE_LIMITS and calls send once
+    per chunk, in order. The send function should raise on failure;
+    configured() says whether the channel has the credentials it needs.
+    """
+    def decorator(send):
+        CHANNELS[name] = Channel(
+            name=name,
+            send=send,
+            configured=configured,
+            deadline=NOTIFY_DEADLINES.get(name, NOTIFY_DEFAULT_DEADLINE),
+        )
+        return send
+
+    return decorator
+
+
+@register_channel(
+    "telegram", configured=lambda: bool(TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID)
+)
+async def _send_telegram(chunk: str, chat_id: str | None = None):
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    bucket = _bucket("telegram", str(chat_id))
+    bot_wide = _bucket("telegram")
     payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text,
+        "chat_id": chat_id,
+        "text": chunk,
         "parse_mode": "Markdown",
     }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=payload, timeout=15)
-            if resp.status_code != 200:
-                logger.error(f"Telegram error: {resp.status_code} {resp.text}")
-        except Exception as e:
-            logger.error(f"Telegram send failed: {e}")
+    while True:
+        await bucket.acquire()
+        await bot_wide.acquire()
+        resp = await get_client().post(url, json=payload)
+        if resp.status_code != 429:
+            break
+        wait = _retry_after(resp)
+        logger.warning(f"Telegram rate limited — retrying in {wait:.0f}s")
+        bucket.pause(wait)
+    if resp.status_code != 200:
+        raise DeliveryError(f"{resp.status_code} {resp.text}")
 
 
-async def send_whatsapp(text: str):
-    """Send a message via Callmebot WhatsApp API."""
-    if not CALLMEBOT_PHONE or not CALLMEBOT_API_KEY:
-        logger.warning("WhatsApp (Callmebot) not configured — skipping")
-        return
-
-    # Callmebot expects URL-encoded text
-    encoded = urllib.parse.quote_plus(text)
+@register_channel(
+    "whatsapp", configured=lambda: bool(CALLMEBOT_PHONE and CALLMEBOT_API_KEY)
+)
+async def _send_whatsapp(chunk: str):
+    bucket = _bucket("whatsapp", str(CALLMEBOT_PHONE))
+    # Callmebot expects URL-encoded text in the query string (hence the
+    # short chunk limit)
+    encoded = urllib.parse.quote_plus(chunk)
     url = (
-        f"https://api.callmebot.com/whatsapp.php"
+        f"{CALLMEBOT_API_URL}/whatsapp.php"
         f"?phone={CALLMEBOT_PHONE}"
         f"&text={encoded}"
         f"&apikey={CALLMEBOT_API_KEY}"
     )
+    while True:
+        await bucket.acquire()
+        resp = await get_client().get(url)
+        if resp.status_code != 429:
+            break
+        wait = _retry_after(resp)
+        logger.warning(f"WhatsApp rate limited — retrying in {wait:.0f}s")
+        bucket.pause(wait)
+    if resp.status_code != 200:
+        raise DeliveryError(f"{resp.status_code} {resp.text}")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, timeout=30)
-            if resp.status_code != 200:
-                logger.error(f"WhatsApp error: {resp.status_code} {resp.text}")
-        except Exception as e:
-            logger.error(f"WhatsApp send failed: {e}")
+
+async def deliver(channel: Channel, text: str, skip_chunks: int = 0) -> DeliveryResult:
+    """Send through one channel, each chunk under the channel's deadline.
+    Never raises.
+
+    skip_chunks resumes a message whose first chunks were delivered by an
+    earlier, partly failed attempt (see DeliveryResult.chunks_sent).
+    """
+    if not channel.configured():
+        logger.warning(f"{channel.name} not configured — skipping")
+        return DeliveryResult(channel.name, "skipped", 0.0)
+
+    limit = CHANNEL_MESSAGE_LIMITS.get(channel.name)
+    chunks = split_message(text, limit) if limit else [text]
+    start = time.monotonic()
+    status, error = "ok", None
+    sent = skip_chunks
+    try:
+        for chunk in chunks[skip_chunks:]:
+            await asyncio.wait_for(channel.send(chunk), channel.deadline)
+            sent += 1
+    except asyncio.TimeoutError:
+        status, error = "timeout", f"chunk {sent + 1} not delivered within {channel.deadline}s"
+    except Exception as e:
+        status, error = "failed", str(e) or type(e).__name__
+    latency = time.monotonic() - start
+    metrics.notify_latency.observe(latency, channel.name)
+
+    if error:
+        metrics.messages_failed.inc(channel.name)
+        logger.error(f"{channel.name} send {status}: {error}")
+    else:
+        metrics.messages_sent.inc(channel.name)
+    return DeliveryResult(channel.name, status, latency, error, sent)
+
+
+def channels_for(chat_id: str | None = None) -> dict[str, Channel]:
+    """
+    Channels that reach a chat. The owner (TELEGRAM_CHAT_ID, or None) gets
+    every registered channel; other chats only get Telegram, addressed to them.
+    """
+    if chat_id is None or str(chat_id) == str(TELEGRAM_CHAT_ID):
+        return CHANNELS
+    return {
+        "telegram": dataclasses.replace(
+            CHANNELS["telegram"],
+            send=functools.partial(_send_telegram, chat_id=chat_id),
+        )
+    }
+
+
+async def send_telegram(text: str, chat_id: str | None = None) -> DeliveryResult:
+    """Send a message via Telegram Bot API (to TELEGRAM_CHAT_ID by default)."""
+    return await deliver(channels_for(chat_id)["telegram"], text)
+
+
+async def send_whatsapp(text: str) -> DeliveryResult:
+    """Send a message via Callmebot WhatsApp API."""
+    return await deliver(CHANNELS["whatsapp"], text)
 
 
-async def notify(text: str):
-    """Send to both Telegram and WhatsApp."""
-    await send_telegram(text)
-    await send_whatsapp(text)
+async def notify(
+    text: str, channels: list[str] | None = None, chat_id: str | None = None
+) -> list[DeliveryResult]:
+    """Send to every channel reaching the chat (or just `channels`) concurrently."""
+    targets = [
+        channel
+        for name, channel in channels_for(chat_id).items()
+        if channels is None or name in channels
+    ]
+    return list(await asyncio.gather(*(deliver(c, text) for c in targets)))
@@ -0,0 +1,262 @@
+"""
+Durable outbound message queue.
+
+Scheduled messages go through the outbox instead of straight to notify():
+each message is stored in the bot state under an idempotency key, sent to
+every channel, and kept for retry (exponential backoff with jitter) on the
+channels that failed. Anything still undelivered survives to the next
+run.py invocation or main.py tick; after OUTBOX_MAX_ATTEMPTS tries a message
+moves to the dead-letter list.
+
+A message can carry state_updates: state values to merge into the chat's
+state (with state_merge.py's rules) once it is settled — delivered or
+dead-lettered. That way bookkeeping such as the issue poll's seen marks
+and cursors lands whichever drain, in whichever process, finishes the job.
+
+Each chat's outbox lives in that chat's own state (see tenants.py). The
+async functions touch it through state.run_locked, so the file work stays
+off the event loop, and one chat's outbox is drained by one task at a time.
+"""
+
+import asyncio
+import copy
+import hashlib
+import logging
+import random
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from config import (
+    TIMEZONE,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_SENT_TTL,
+)
+from notifier import channels_for, deliver
+import metrics
+from state import get_state_value, set_state_value, run_locked
+from state_merge import merge_value
+import tenants
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "outbox"
+
+# Chats (other than the owner) known to have undelivered messages
+_pending_chats: set[str] = set()
+# One drain at a time per chat, so a message is never delivered twice
+_drain_locks: dict[str | None, asyncio.Lock] = {}
+
+
+def _chat(chat_id) -> str | None:
+    """One key per outbox: None for the owner, whether passed as None or as
+    TELEGRAM_CHAT_ID, else the chat ID as a string."""
+    if chat_id is None or tenants.is_owner(chat_id):
+        return None
+    return str(chat_id)
+
+
+def _load(chat_id: str | None = None) -> dict:
+    # A private copy: drain() edits messages while the I/O thread may be
+    # writing the cached state out
+    box = copy.deepcopy(get_state_value(STATE_KEY, chat_id=chat_id) or {})
+    box.setdefault("pending", [])  # messages waiting for (re)delivery
+    box.setdefault("dead", [])  # messages that ran out of attempts
+    box.setdefault("sent", {})  # {idempotency key: delivered at}
+    if chat_id is not None and box["pending"]:
+        _pending_chats.add(chat_id)
+    return box
+
+
+def _save(box: dict, chat_id: str | None = None):
+    cutoff = time.time() - OUTBOX_SENT_TTL
+    box["sent"] = {k: t for k, t in box["sent"].items() if t >= cutoff}
+    set_state_value(STATE_KEY, box, chat_id=chat_id)
+    if chat_id is not None:
+        if box["pending"]:
+            _pending_chats.add(chat_id)
+        else:
+            _pending_chats.discard(chat_id)
+
+
+def _backoff(attempts: int) -> float:
+    """Exponential backoff with jitter: half fixed, half random."""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def slot_key(kind: str) -> str:
+    """Idempotency key for a scheduled message, e.g. 'reminder:2025-02-03:07'."""
+    now = datetime.now(ZoneInfo(TIMEZONE))
+    return f"{kind}:{now:%Y-%m-%d}:{now.hour:02d}"
+
+
+def has_work(key: str | None = None, chat_id: str | None = None) -> bool:
+    """True if a chat has messages to retry, or `key` hasn't been sent yet."""
+    box = _load(_chat(chat_id))
+    if box["pending"]:
+        return True
+    return key is not None and key not in box["sent"]
+
+
+def pending_updates(state_key: str, chat_id: str | None = None) -> list:
+    """The state_updates[state_key] values of messages still pending."""
+    return [
+        msg["state_updates"][state_key]
+        for msg in _load(_chat(chat_id))["pending"]
+        if state_key in msg.get("state_updates", {})
+    ]
+
+
+def enqueue(
+    text: str,
+    key: str | None = None,
+    channels: list[str] | None = None,
+    chat_id: str | None = None,
+    state_updates: dict | None = None,
+) -> bool:
+    """
+    Queue a message for delivery to a chat (the owner by default). Returns
+    False if a message with the same idempotency key is already queued, was
+    delivered recently or was dead-lettered.
+    """
+    key = key or hashlib.sha256(text.encode()).hexdigest()[:16]
+    chat_id = _chat(chat_id)
+    box = _load(chat_id)
+    if key in box["sent"] or any(m["key"] == key for m in box["pending"] + box["dead"]):
+        logger.info(f"Outbox: {key} already queued, sent or dead — skipping")
+        return False
+
+    msg = {
+        "key": key,
+        "text": text,
+        "channels": channels or list(channels_for(chat_id)),
+        "attempts": 0,
+        "next_attempt": 0,
+        "created": time.time(),
+        "last_error": None,
+    }
+    if state_updates:
+        msg["state_updates"] = state_updates
+    box["pending"].append(msg)
+    _save(box, chat_id)
+    return True
+
+
+async def drain(chat_id: str | None = None) -> int:
+    """
+    Try every due message for a chat, in queue order. Returns how many are
+    still pending afterwards.
+    """
+    chat_id = _chat(chat_id)
+    lock = _drain_locks.get(chat_id)
+    if lock is None:
+        lock = _drain_locks[chat_id] = asyncio.Lock()
+    async with lock:
+        return await _drain(chat_id)
+
+
+async def _drain(chat_id: str | None) -> int:
+    box = await run_locked(chat_id, _load, chat_id)
+    if not box["pending"]:
+        return 0
+
+    now = time.time()
+    # {key: msg after this attempt, or None once delivered / dead}
+    outcomes: dict[str, dict | None] = {}
+    for msg in box["pending"]:
+        if msg["next_attempt"] > now:
+            continue
+
+        results = await _deliver_all(msg, chat_id)
+        failed = [r for r in results if not r.ok and r.status != "skipped"]
+        if not failed:
+            outcomes[msg["key"]] = None
+            continue
+
+        msg["channels"] = [r.channel for r in failed]
+        # Chunks that made it are not sent again on the next attempt
+        msg["chunks_sent"] = {r.channel: r.chunks_sent for r in failed if r.chunks_sent}
+        msg["attempts"] += 1
+        msg["last_error"] = "; ".join(f"{r.channel}: {r.error}" for r in failed)
+        if msg["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Outbox: giving up on {msg['key']} ({msg['last_error']})")
+            msg["dead"] = True
+            metrics.messages_dead.inc()
+        else:
+            msg["next_attempt"] = time.time() + _backoff(msg["attempts"])
+            metrics.messages_retried.inc()
+            logger.warning(
+                f"Outbox: {msg['key']} failed on {', '.join(msg['channels'])} — "
+                f"retry {msg['attempts']}/{OUTBOX_MAX_ATTEMPTS - 1} scheduled"
+            )
+        outcomes[msg["key"]] = msg
+
+    if not outcomes:
+        return len(box["pending"])
+    return await run_locked(chat_id, _record_outcomes, outcomes, chat_id)
+
+
+def _record_outcomes(outcomes: dict[str, dict | None], chat_id: str | None) -> int:
+    """Fold a drain's results into the current outbox (which may have gained
+    messages while we were delivering). Returns how many are still pending."""
+    box = _load(chat_id)
+    still_pending = []
+    for msg in box["pending"]:
+        if msg["key"] not in outcomes:
+            still_pending.append(msg)
+            continue
+        attempted = outcomes[msg["key"]]
+        if attempted is None:
+            box["sent"][msg["key"]] = time.time()
+            _apply_updates(msg, chat_id)
+        elif attempted.pop("dead", False):
+            box["dead"].append(attempted)
+            _apply_updates(attempted, chat_id)
+        else:
+            still_pending.append(attempted)
+    box["pending"] = still_pending
+    _save(box, chat_id)
+    return len(still_pending)
+
+
+def _apply_updates(msg: dict, chat_id: str | None):
+    """Merge a settled message's state_updates into the chat's state."""
+    for key, value in msg.get("state_updates", {}).items():
+        current = get_state_value(key, chat_id=chat_id)
+        set_state_value(key, merge_value(key, current, value), chat_id=chat_id)
+
+
+async def drain_all():
+    """Drain the owner's outbox and every chat known to have a backlog.
+
+    Chats drain concurrently, TENANT_CONCURRENCY at a time (tenants.fan_out).
+    """
+    await tenants.fan_out(drain, [None, *_pending_chats])
+
+
+async def _deliver_all(msg: dict, chat_id: str | None):
+    channels = channels_for(chat_id)
+    progress = msg.get("chunks_sent", {})
+    return await asyncio.gather(
+        *(
+            deliver(channels[name], msg["text"], progress.get(name, 0))
+            for name in msg["channels"]
+            if name in channels
+        )
+    )
+
+
+async def send(
+    text: str,
+    key: str | None = None,
+    chat_id: str | None = None,
+    state_updates: dict | None = None,
+) -> int:
+    """Queue a message for a chat and flush its outbox right away."""
+    await run_locked(
+        chat_id, enqueue, text, key, chat_id=chat_id, state_updates=state_updates
+    )
+    return await drain(chat_id)
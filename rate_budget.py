@@ -0,0 +1,162 @@
+"""
+GitHub API rate-limit budget.
+
+Every GitHub response reports the remaining budget (X-RateLimit-Remaining,
+X-RateLimit-Limit, X-RateLimit-Reset, plus Retry-After when throttled).
+RateBudget mirrors that as a token bucket per rate-limit resource ("core"
+for issue listings, "search" for search/issues), keeps it in the bot state
+between runs, and decides which queries fit in what is left — most recently
+active repos first, anything that doesn't fit deferred to the next slot.
+"""
+
+import copy
+import logging
+import time
+
+from config import GITHUB_TOKEN, GITHUB_BUDGET_RESERVE
+from state import get_state_value, set_state_value
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "github_budget"
+
+# Hourly (core) / per-minute (search) limits, used until GitHub tells us
+DEFAULT_LIMITS = {
+    "core": 5000 if GITHUB_TOKEN else 60,
+    "search": 30 if GITHUB_TOKEN else 10,
+}
+
+
+def _int_header(headers, name: str) -> int | None:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateBudget:
+    """Token bucket per GitHub rate-limit resource, refilled at reset time."""
+
+    def __init__(self, data: dict | None = None):
+        data = data or {}
+        # {resource: {"remaining", "limit", "reset", "blocked_until"}}
+        self.buckets: dict[str, dict] = data.get("buckets", {})
+        # {repo: unix time the repo last produced a new issue}
+        self.activity: dict[str, float] = data.get("activity", {})
+        # Names of queries that were pushed to this slot last time
+        self.deferred: list[str] = data.get("deferred", [])
+
+    @classmethod
+    def load(cls) -> "RateBudget":
+        # A private copy: acquire() and update() run on the event loop while
+        # the I/O thread may be writing the cached state out
+        return cls(copy.deepcopy(get_state_value(STATE_KEY, {}) or {}))
+
+    def save(self):
+        set_state_value(
+            STATE_KEY,
+            {
+                "buckets": self.buckets,
+                "activity": self.activity,
+                "deferred": self.deferred,
+            },
+        )
+
+    def _bucket(self, resource: str) -> dict:
+        bucket = self.buckets.setdefault(
+            resource,
+            {
+                "remaining": DEFAULT_LIMITS.get(resource, 60),
+                "limit": DEFAULT_LIMITS.get(resource, 60),
+                "reset": 0,
+                "blocked_until": 0,
+            },
+        )
+        if bucket["reset"] and time.time() >= bucket["reset"]:
+            # The window rolled over since we last heard from GitHub
+            bucket["remaining"] = bucket["limit"]
+            bucket["reset"] = 0
+        return bucket
+
+    def available(self, resource: str) -> int:
+        bucket = self._bucket(resource)
+        if time.time() < bucket["blocked_until"]:
+            return 0
+        return bucket["remaining"]
+
+    def acquire(self, resource: str) -> bool:
+        """Take one request from the bucket. False means don't send it."""
+        if self.available(resource) <= 0:
+            return False
+        self._bucket(resource)["remaining"] -= 1
+        return True
+
+    def update(self, resource: str, status_code: int, headers, body: str = ""):
+        """Sync the bucket with the rate-limit headers of a response.
+
+        A 403 only pauses the resource if it is a rate limit (no requests
+        left, a Retry-After, or a body saying so); other 403s, such as a
+        token without access to a repo, leave the budget alone.
+        """
+        resource = headers.get("X-RateLimit-Resource", resource)
+        bucket = self._bucket(resource)
+        remaining = _int_header(headers, "X-RateLimit-Remaining")
+        limit = _int_header(headers, "X-RateLimit-Limit")
+        reset = _int_header(headers, "X-RateLimit-Reset")
+        if remaining is not None:
+            bucket["remaining"] = remaining
+        if limit is not None:
+            bucket["limit"] = limit
+        if reset is not None:
+            bucket["reset"] = reset
+
+        retry_after = _int_header(headers, "Retry-After")
+        rate_limited = status_code == 429 or (
+            status_code == 403
+            and (remaining == 0 or retry_after is not None or "rate limit" in body.lower())
+        )
+        if rate_limited:
+            if retry_after is not None:
+                bucket["blocked_until"] = time.time() + retry_after
+            elif remaining == 0 and reset:
+                bucket["blocked_until"] = reset
+            else:
+                # Secondary rate limit without a hint — back off a minute
+                bucket["blocked_until"] = time.time() + 60
+            logger.warning(
+                f"GitHub {resource} rate limit hit — paused until "
+                f"{time.strftime('%H:%M:%S', time.localtime(bucket['blocked_until']))}"
+            )
+
+    def record_activity(self, repo: str):
+        self.activity[repo] = time.time()
+
+    def plan(self, queries: list[dict]) -> list[dict]:
+        """
+        Order queries by priority and return the ones that fit the budget.
+        Queries deferred last time go first, then the most recently active
+        repos. The rest are remembered and go first next time.
+        """
+        def priority(query):
+            last_active = max((self.activity.get(r, 0) for r in query["repos"]), default=0)
+            return (query["name"] not in self.deferred, -last_active)
+
+        left = {}
+        run, deferred = [], []
+        for query in sorted(queries, key=priority):
+            resource = query["resource"]
+            if resource not in left:
+                left[resource] = self.available(resource) - GITHUB_BUDGET_RESERVE
+            if left[resource] > 0:
+                left[resource] -= 1
+                run.append(query)
+            else:
+                deferred.append(query)
+
+        self.deferred = [query["name"] for query in deferred]
+        if deferred:
+            logger.info(
+                f"GitHub budget low — deferring {', '.join(self.deferred)} to the next slot"
+            )
+        return run
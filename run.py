@@ -1,31 +1,32 @@
 """
 Single-run script for GitHub Actions.
 Each invocation: check for /done replies, update state, send notification.
+
+Every run is a fresh process, so only config and state are imported up
+front; the HTTP client, notifier, scheduler and GitHub checker are imported
+where they're first used. A run with no pending updates and no due message
+exits before touching any of them beyond getUpdates.
+
+    python run.py --profile-startup   # print import and phase timings
 """
 
+import time
+
+_BOOT = time.perf_counter()
+
 import asyncio
-import json
+import contextlib
 import logging
 import os
 import sys
 from datetime import datetime
 
-import httpx
-
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TIMEZONE
-from tasks import get_tasks_for_week
-from state import (
-    load_state,
-    save_state,
-    get_current_week,
-    get_incomplete_tasks,
-    get_completed_tasks,
-    mark_task_done,
-    all_tasks_complete,
-    get_and_advance_notify_index,
-)
-from notifier import send_telegram, send_whatsapp, notify
-from github_checker import check_new_issues, format_issue_alerts
+_BOOT_MODULES = set(sys.modules)
+
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, METRICS_FILE
+from state import get_state_value, set_state_value, flush_state
+
+_IMPORTED = time.perf_counter()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,192 +34,172 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# getUpdates returns at most 100 updates per call
+UPDATES_PAGE_SIZE = 100
 
-async def process_telegram_updates():
-    """Check for /done messages from Telegram and process them."""
-    state = load_state()
-    last_update_id = state.get("last_update_id", 0)
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
-    params = {"offset": last_update_id + 1, "timeout": 5}
-
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(url, params=params, timeout=15)
-            data = resp.json()
-        except Exception as e:
-            logger.error(f"Failed to get updates: {e}")
-            return
+# Scheduled message kind (outbox.slot_key) sent by each RUN_MODE
+SCHEDULED_KINDS = {"notify": "reminder", "summary": "summary"}
 
-    if not data.get("ok"):
-        logger.error(f"Telegram getUpdates failed: {data}")
-        return
 
-    updates = data.get("result", [])
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
+class StartupProfile:
+    """Wall-clock time of each run phase and the modules it imported."""
 
-    for update in updates:
-        state["last_update_id"] = update["update_id"]
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.rows = [("imports", _IMPORTED - _BOOT, set(sys.modules) - _BOOT_MODULES)]
 
-        msg = update.get("message", {})
-        chat_id = str(msg.get("chat", {}).get("id", ""))
-        text = msg.get("text", "").strip()
-
-        # Only process messages from authorized chat
-        if chat_id != str(TELEGRAM_CHAT_ID):
-            continue
-
-        # Handle /done command
-        if text.startswith("/done"):
-            parts = text.split()
-            if len(parts) >= 2:
-                try:
-                    task_num = int(parts[1])
-                    task_index = task_num - 1
-
-                    if 0 <= task_index < len(tasks):
-                        was_new = mark_task_done(week, task_index)
-                        completed = get_completed_tasks(week)
-                        remaining = len(tasks) - len(completed)
-
-                        if was_new:
-                            if remaining == 0:
-                                await send_telegram(
-                                    f"*Task {task_num} — DONE*\n\n"
-                                    f"'{tasks[task_index]}'\n\n"
-                                    f"*ALL TASKS COMPLETE FOR WEEK {week}.*\n"
-                                    f"Next week's tasks load automatically."
-                                )
-                            else:
-                                await send_telegram(
-                                    f"*Task {task_num} — DONE*\n\n"
-                                    f"'{tasks[task_index]}'\n\n"
-                                    f"{remaining} task{'s' if remaining != 1 else ''} remaining this week."
-                                )
-                        else:
-                            await send_telegram(f"Task {task_num} was already marked done.")
-                    else:
-                        await send_telegram(f"Invalid task number. This week has tasks 1-{len(tasks)}.")
-                except ValueError:
-                    await send_telegram("Usage: /done <number>\nExample: /done 3")
-
-        # Handle /status command
-        elif text == "/status":
-            completed = get_completed_tasks(week)
-            incomplete = get_incomplete_tasks(week, tasks)
-            lines = [f"*Week {week} — {len(completed)}/{len(tasks)} complete*\n"]
-            for i, task in enumerate(tasks):
-                status = "done" if i in completed else "TODO"
-                lines.append(f"  {i + 1}. [{status}] {task}")
-            await send_telegram("\n".join(lines))
-
-        # Handle /tasks command
-        elif text == "/tasks":
-            completed = get_completed_tasks(week)
-            lines = [f"*Week {week} Tasks:*\n"]
-            for i, task in enumerate(tasks):
-                marker = "[x]" if i in completed else "[ ]"
-                lines.append(f"{i + 1}. {marker} {task}")
-            await send_telegram("\n".join(lines))
-
-        # Handle /week command
-        elif text == "/week":
-            month = ((week - 1) // 4) + 1
-            await send_telegram(
-                f"*Week {week} (Month {month})*\n\n"
-                f"Send /tasks to see this week's list.\n"
-                f"Send /status for progress."
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        before = set(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.rows.append(
+                (name, time.perf_counter() - start, set(sys.modules) - before)
             )
 
-    save_state(state)
+    def report(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - _BOOT
+        print("\nStartup profile:", file=sys.stderr)
+        for name, elapsed, modules in self.rows:
+            top = sorted({m.split(".")[0] for m in modules})
+            imported = f"  +{len(modules)} modules: {', '.join(top)}" if modules else ""
+            print(f"  {name:<18} {elapsed * 1000:8.1f} ms{imported}", file=sys.stderr)
+        print(f"  {'total':<18} {total * 1000:8.1f} ms", file=sys.stderr)
 
 
-async def send_task_notification():
-    """Send one incomplete task."""
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
+async def fetch_updates(offset: int) -> list[dict] | None:
+    """Drain getUpdates page by page until the backlog is empty."""
+    import http_client
 
-    if all_tasks_complete(week, len(tasks)):
-        await notify(
-            f"*Week {week} — ALL TASKS COMPLETE*\n\n"
-            f"Everything done. Next week's tasks load automatically.\n"
-            f"Rest up or get ahead."
-        )
-        return
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
+    updates = []
+
+    while True:
+        params = {"offset": offset, "limit": UPDATES_PAGE_SIZE, "timeout": 0}
+        try:
+            resp = await http_client.get_client().get(url, params=params, timeout=15)
+            data = resp.json()
+        except Exception as e:
+            logger.error(f"Failed to get updates: {e}")
+            return updates or None
 
-    incomplete = get_incomplete_tasks(week, tasks)
-    if not incomplete:
-        return
+        if not data.get("ok"):
+            logger.error(f"Telegram getUpdates failed: {data}")
+            return updates or None
 
-    slot = get_and_advance_notify_index()
-    pick_index = slot % len(incomplete)
-    task_idx, task_text = incomplete[pick_index]
+        page = data.get("result", [])
+        updates.extend(page)
+        if len(page) < UPDATES_PAGE_SIZE:
+            return updates
+        offset = page[-1]["update_id"] + 1
 
-    total = len(tasks)
-    done_count = total - len(incomplete)
 
-    message = (
-        f"*Task {task_idx + 1}/{total} — INCOMPLETE*\n\n"
-        f"{task_text}\n\n"
-        f"Progress: {done_count}/{total} done (Week {week})\n"
-        f"Reply /done {task_idx + 1} when finished."
-    )
+async def process_telegram_updates() -> int:
+    """
+    Check for /done (and other) messages from Telegram and process them.
 
-    await notify(message)
+    The whole backlog is applied to the in-memory state and written once;
+    replies are collected per chat and sent as one message each. Returns the
+    number of updates processed.
+    """
+    last_update_id = get_state_value("last_update_id", 0)
+    updates = await fetch_updates(last_update_id + 1)
+    if not updates:
+        return 0
 
+    import commands
+    from notifier import send_telegram
 
-async def send_status_summary():
-    """End-of-day summary."""
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
-    incomplete = get_incomplete_tasks(week, tasks)
-    done_count = len(tasks) - len(incomplete)
+    replies: dict[str, list[str]] = {}
 
-    if incomplete:
-        remaining = "\n".join([f"  {i + 1}. {t}" for i, t in incomplete])
-        message = (
-            f"*End of Day — Week {week}*\n\n"
-            f"Done: {done_count}/{len(tasks)}\n\n"
-            f"Still incomplete:\n{remaining}\n\n"
-            f"These will keep coming until you finish them."
-        )
-    else:
-        message = (
-            f"*End of Day — Week {week}*\n\n"
-            f"All {len(tasks)} tasks complete. Solid work."
+    for update in updates:
+        msg = update.get("message", {})
+        chat_id = str(msg.get("chat", {}).get("id", ""))
+        reply = commands.handle(msg.get("text", ""), chat_id)
+        if reply:
+            replies.setdefault(chat_id, []).append(reply)
+
+    set_state_value("last_update_id", updates[-1]["update_id"])
+    flush_state()
+    logger.info(f"Processed {len(updates)} updates")
+
+    await asyncio.gather(
+        *(
+            send_telegram("\n\n".join(texts), chat_id=chat_id)
+            for chat_id, texts in replies.items()
         )
+    )
+    return len(updates)
 
-    await notify(message)
 
+def messages_due(mode: str) -> bool:
+    """Whether any chat has a retry pending or hasn't had this slot's message."""
+    import outbox
+    import tenants
 
-async def check_github_issues():
-    """Check for new issues on target repos."""
-    try:
-        new_issues = await check_new_issues()
-        alert = format_issue_alerts(new_issues)
-        if alert:
-            await notify(alert)
-    except Exception as e:
-        logger.error(f"GitHub issue check failed: {e}")
+    kind = SCHEDULED_KINDS.get(mode)
+    key = outbox.slot_key(kind) if kind else None
+    return any(outbox.has_work(key, chat_id) for chat_id in tenants.list_tenants())
 
 
-async def main():
+async def main(profile: StartupProfile | None = None):
+    profile = profile or StartupProfile(False)
     mode = os.getenv("RUN_MODE", "notify")
     logger.info(f"Running in mode: {mode}")
 
-    # Always process pending /done messages first
-    await process_telegram_updates()
+    with profile.phase("due check"):
+        due = messages_due(mode)
 
-    if mode == "summary":
-        await send_status_summary()
-    elif mode == "notify":
-        await send_task_notification()
-        # Check GitHub issues once daily (on the first run)
-        hour = datetime.now().hour
-        if hour < 10:
-            await check_github_issues()
+    import http_client
+
+    with profile.phase("client start"):
+        await http_client.start()
+    try:
+        # Always process pending /done messages first
+        with profile.phase("telegram updates"):
+            processed = await process_telegram_updates()
+
+        if not processed and not due:
+            logger.info("No pending updates and nothing due — exiting early")
+            return
+
+        import outbox
+        from scheduler import send_reminders, send_status_summary, check_issues
+
+        # Retry anything a previous run failed to deliver
+        with profile.phase("outbox drain"):
+            await outbox.drain_all()
+
+        with profile.phase(mode):
+            if mode == "summary":
+                await send_status_summary()
+            elif mode == "notify":
+                await send_reminders()
+                # Check GitHub issues once daily (on the first run)
+                hour = datetime.now().hour
+                if hour < 10:
+                    await check_issues()
+    finally:
+        # One write for the whole run
+        with profile.phase("flush state"):
+            flush_state()
+        await http_client.close()
+        if METRICS_FILE:
+            import metrics
+
+            metrics.dump(METRICS_FILE)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    profile = StartupProfile("--profile-startup" in sys.argv[1:])
+    try:
+        asyncio.run(main(profile))
+    finally:
+        profile.report()
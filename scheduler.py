@@ -1,91 +1,99 @@
 """
 Scheduled notification logic.
 Fires 6 times daily — each time sends one incomplete task.
+
+Every job fans out over all tenants (see tenants.py) with bounded
+concurrency; each chat's reminder only reads and writes that chat's state.
+State work runs through state.run_locked so it never blocks the event loop.
+Message text comes from commands.py's view cache.
 """
 
+import hashlib
 import logging
 
-from tasks import get_tasks_for_week
-from state import (
-    get_current_week,
-    get_incomplete_tasks,
-    all_tasks_complete,
-    get_and_advance_notify_index,
-)
-from notifier import notify
-from github_checker import check_new_issues, format_issue_alerts
+from state import get_and_advance_notify_index, run_locked
+import commands
+import outbox
+import tenants
 
 logger = logging.getLogger(__name__)
 
 
-async def send_task_notification():
-    """Core scheduled job: send an incomplete task reminder."""
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
-
-    # Check if all tasks are done
-    if all_tasks_complete(week, len(tasks)):
-        await notify(
-            f"*Week {week} — ALL TASKS COMPLETE*\n\n"
-            f"Everything done. Next week's tasks load automatically.\n"
-            f"Rest up or get ahead."
-        )
-        return
-
-    # Get incomplete tasks
-    incomplete = get_incomplete_tasks(week, tasks)
+async def send_reminder(chat_id: str) -> int | None:
+    """Send one chat an incomplete task. Returns the notify slot used."""
+    message, slot = await run_locked(chat_id, _reminder_message, chat_id)
+    if message:
+        await outbox.send(message, key=outbox.slot_key("reminder"), chat_id=chat_id)
+    return slot
+
+
+def _reminder_message(chat_id: str) -> tuple[str | None, int | None]:
+    """Pick the task to remind a chat about (advancing its notify slot)."""
+    view = commands.week_view(chat_id)
+    incomplete = view.incomplete()
     if not incomplete:
-        return
+        return commands.reminder_text(view, None), None
 
     # Round-robin through incomplete tasks so you see different ones each notification
-    slot = get_and_advance_notify_index()
-    pick_index = slot % len(incomplete)
-    task_idx, task_text = incomplete[pick_index]
+    slot = get_and_advance_notify_index(chat_id)
+    task_idx, _ = incomplete[slot % len(incomplete)]
+    return commands.reminder_text(view, task_idx), slot
 
-    total = len(tasks)
-    done_count = total - len(incomplete)
 
-    message = (
-        f"*Task {task_idx + 1}/{total} — INCOMPLETE*\n\n"
-        f"{task_text}\n\n"
-        f"Progress: {done_count}/{total} done (Week {week})\n"
-        f"Reply /done {task_idx + 1} when finished."
-    )
+async def send_reminders() -> dict:
+    """Send every tenant their reminder. Returns {chat_id: slot}."""
+    return await tenants.fan_out(send_reminder)
 
-    await notify(message)
 
-    # Also check for new GitHub issues (once per cycle, at the first slot)
-    if slot == 0:
-        try:
-            new_issues = await check_new_issues()
-            alert = format_issue_alerts(new_issues)
-            if alert:
-                await notify(alert)
-        except Exception as e:
-            logger.error(f"GitHub issue check failed: {e}")
+async def send_task_notification():
+    """Core scheduled job: send an incomplete task reminder."""
+    await send_reminders()
+
+
+async def check_issues():
+    """Poll target repos and alert the owner about new issues."""
+    from github_checker import check_new_issues, format_issue_alerts
+    from issue_cursors import IssueCursors
+
+    try:
+        cursors = await run_locked(None, IssueCursors.load)
+        new_issues = await check_new_issues(cursors)
+        # Issues in an alert that is still being retried go out with it
+        queued = {
+            url
+            for urls in await run_locked(None, outbox.pending_updates, "seen_issues")
+            for url in urls
+        }
+        new_issues = [issue for issue in new_issues if issue["url"] not in queued]
+        alert = format_issue_alerts(new_issues)
+        if alert:
+            # Keyed on the issues, not the text: query order (and so the
+            # text) can change between polls
+            urls = sorted(issue["url"] for issue in new_issues)
+            key = "issues:" + hashlib.sha256("\n".join(urls).encode()).hexdigest()[:16]
+            # The issues are marked seen and the cursors advanced once the
+            # outbox settles the alert, on whichever attempt that happens
+            await outbox.send(
+                alert,
+                key=key,
+                state_updates={"seen_issues": urls, "issue_cursors": cursors.staged},
+            )
+        elif not queued:
+            await run_locked(None, cursors.save)
+    except Exception as e:
+        logger.error(f"GitHub issue check failed: {e}")
+
+
+async def send_summary(chat_id: str):
+    """Send one chat its end-of-day status."""
+    message = await run_locked(chat_id, _summary_message, chat_id)
+    await outbox.send(message, key=outbox.slot_key("summary"), chat_id=chat_id)
+
+
+def _summary_message(chat_id: str) -> str:
+    return commands.summary_text(commands.week_view(chat_id))
 
 
 async def send_status_summary():
     """Send a brief status at the end of day (10 PM slot)."""
-    week = get_current_week()
-    tasks = get_tasks_for_week(week)
-    incomplete = get_incomplete_tasks(week, tasks)
-    done_count = len(tasks) - len(incomplete)
-
-    if incomplete:
-        remaining = "\n".join(
-            [f"  {i + 1}. {t}" for i, t in incomplete]
-        )
-        message = (
-            f"*End of Day — Week {week}*\n\n"
-            f"Done: {done_count}/{len(tasks)}\n\n"
-            f"Still incomplete:\n{remaining}\n\n"
-            f"These will keep coming until you finish them."
-        )
-    else:
-        message = (
-            f"*End of Day — Week {week}*\n\n"
-            f"All {len(tasks)} tasks complete. Solid work."
-        )
-
-    await notify(message)
+    await tenants.fan_out(send_summary)
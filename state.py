@@ -1,13 +1,65 @@
 """
 Persistence layer for tracking task completion.
 State file lives in the repo — GitHub Actions commits it after each run.
+
+All helpers go through one StateStore: state.json is parsed once and the
+parsed copy is reused until the file's mtime changes. Mutations are kept as
+small records and only written on flush() — at the end of a run.py
+invocation, on a debounce timer in main.py, or at interpreter exit.
+
+With STATE_JOURNAL enabled, flush() appends those records to
+state.json.journal instead of rewriting the whole document; the journal is
+compacted into the snapshot once it passes a size or age threshold.
+
+Several processes may write the same file. Every snapshot carries a version
+and flush() is a compare-and-swap under state.json.lock: if the file is no
+longer the version we loaded, our records are replayed onto the current
+contents with state_merge.py's rules (union for completions and seen issues,
+max for last_update_id, ...) instead of overwriting them.
+
+STATE_BACKEND=sqlite (or a .db/.sqlite STATE_FILE) swaps in the SQLite store
+from state_sqlite.py, which exposes the same operations.
+
+The owner's chat (TELEGRAM_CHAT_ID) uses STATE_FILE; with MULTI_TENANT every
+other chat gets its own store in TENANT_STATE_DIR. Pass chat_id to pick one.
+
+The plain functions block on file I/O, which is fine for run.py. Code on
+main.py's event loop calls them through run_locked (or aget_state_value),
+which does the I/O on a dedicated thread, one chat at a time.
 """
 
+import asyncio
+import atexit
+import contextlib
+import copy
+import functools
 import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 
-from config import STATE_FILE, START_DATE
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, flushes still merge
+    fcntl = None
+
+from config import (
+    TELEGRAM_CHAT_ID,
+    STATE_FILE,
+    STATE_BACKEND,
+    START_DATE,
+    STATE_JOURNAL,
+    STATE_JOURNAL_MAX_BYTES,
+    STATE_JOURNAL_MAX_AGE,
+    TENANT_STATE_DIR,
+)
+import metrics
+from state_merge import SEEN_ISSUES_LIMIT, merge_value
+
+logger = logging.getLogger(__name__)
 
 
 DEFAULT_STATE = {
@@ -15,88 +67,579 @@ DEFAULT_STATE = {
     "completed": {},  # {"week_number": [task_indices]}
     "seen_issues": [],  # GitHub issue URLs already notified about
     "notify_index": 0,  # Which notification slot we're on (0-5) for round-robin
+    "version": 0,  # Bumped on every snapshot write (compare-and-swap token)
 }
 
 
-def _ensure_dir():
-    dirname = os.path.dirname(STATE_FILE)
+def _apply(state: dict, record: dict, merge: bool = False) -> bool:
+    """Apply one mutation record to a state dict. Returns True if it changed it.
+
+    Records are idempotent, so replaying a journal twice is harmless. With
+    merge, "set" records are merged into the current value (see
+    state_merge.py) — for applying our records onto state another writer
+    produced. The journal itself is replayed without merge.
+    """
+    op = record["op"]
+    if op == "done":
+        done = state["completed"].setdefault(str(record["week"]), [])
+        if record["task"] in done:
+            return False
+        done.append(record["task"])
+        return True
+    if op == "seen":
+        seen = state["seen_issues"]
+        if record["url"] in seen:
+            return False
+        seen.append(record["url"])
+        del seen[:-SEEN_ISSUES_LIMIT]
+        return True
+    if op == "set":
+        key, value = record["key"], record["value"]
+        state[key] = merge_value(key, state.get(key), value) if merge else value
+        return True
+    raise ValueError(f"Unknown state op: {op!r}")
+
+
+def _atomic_write_json(path: str, data: dict):
+    """Write JSON through a temp file + rename so readers never see half a file."""
+    _ensure_dir(path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on path + ".lock", held across read-compare-write."""
+    if fcntl is None:
+        yield
+        return
+    _ensure_dir(path)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _file_stamp(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+# All state file I/O started from the event loop runs on this one thread, so
+# the loop never blocks on open()/fsync and writes never race each other.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-io")
+
+
+def _synchronized(method):
+    """Run a store method under the store's lock (loop thread vs. I/O thread)."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._mutex:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception():
+        logger.error(f"Background state write failed: {future.exception()}")
+
+
+class WriteBackStore:
+    """Base for stores that buffer changes and write them on flush()."""
+
+    def __init__(self):
+        # Seconds to wait after a mutation before flushing. None = only flush
+        # when flush() is called explicitly.
+        self.flush_delay: float | None = None
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # Bumped on every change (ours or a reload), so readers such as
+        # api.py can tell whether their cached view is stale without I/O.
+        self.revision = 0
+        # Guards the cache against the loop thread and the I/O thread
+        self._mutex = threading.RLock()
+        # Event loop that owns the debounce timer (set by run_locked)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _schedule_flush(self):
+        if self.flush_delay is None or self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Mutated on the I/O thread: arm the timer on the owning loop
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._arm_flush)
+            return
+        self._loop = loop
+        self._arm_flush()
+
+    def _arm_flush(self):
+        # Loop thread only, and without _mutex: the I/O thread may hold it
+        # for a whole write.
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_delay, self._flush_in_background
+            )
+
+    def _flush_in_background(self):
+        """Debounce timer callback: write on the state thread, not the loop."""
+        self._flush_handle = None
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(_executor, self._write).add_done_callback(_log_failure)
+
+    def _cancel_flush(self):
+        handle, self._flush_handle = self._flush_handle, None
+        if handle is not None:
+            handle.cancel()
+
+    def flush(self):
+        """Write pending changes now."""
+        self._cancel_flush()
+        self._write()
+
+    def _write(self):
+        raise NotImplementedError
+
+    def check(self):
+        """Notice changes made outside this process (bumps revision if any)."""
+        raise NotImplementedError
+
+
+class StateStore(WriteBackStore):
+    """Cached, write-back view of a JSON state file (optionally journaled)."""
+
+    def __init__(self, path: str, journal: bool = False):
+        super().__init__()
+        self.path = path
+        self.journal_path = f"{path}.journal" if journal else None
+        self._state: dict | None = None
+        self._stamp: tuple | None = None
+        self._seen: set[str] = set()
+        self._pending: list[dict] = []
+        self._journal_since: float | None = None
+
+    def _stamps(self) -> tuple:
+        if self.journal_path is None:
+            return (_file_stamp(self.path),)
+        return (_file_stamp(self.path), _file_stamp(self.journal_path))
+
+    def _read(self) -> dict:
+        with metrics.state_load.time():
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    state = json.load(f)
+            else:
+                state = {}
+            for key, value in DEFAULT_STATE.items():
+                state.setdefault(key, copy.deepcopy(value))
+            if self.journal_path:
+                self._replay(state)
+        return state
+
+    def _replay(self, state: dict):
+        """Apply the journal tail on top of the snapshot."""
+        self._journal_since = None
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-append leaves a torn line — skip it
+                    logger.warning(f"Ignoring torn journal record in {self.journal_path}")
+                    continue
+                if self._journal_since is None:
+                    self._journal_since = record.get("ts", time.time())
+                # Appends are serialized by the file lock and "set" records
+                # carry already-merged values, so plain in-order replay is
+                # right (and keeps pruned outbox keys pruned).
+                _apply(state, record)
+
+    def _set_state(self, state: dict):
+        self._state = state
+        self._seen = set(state["seen_issues"])
+        self.revision += 1
+
+    @_synchronized
+    def get(self) -> dict:
+        """Return the cached state, re-reading the file only if it changed.
+
+        Pending changes win over external edits; they are replayed on top of
+        the new file contents on the next flush.
+        """
+        stamp = self._stamps()
+        if self._state is None or (stamp != self._stamp and not self._pending):
+            self._set_state(self._read())
+            self._stamp = stamp
+        return self._state
+
+    @_synchronized
+    def check(self):
+        self.get()
+
+    def _record(self, record: dict):
+        self._pending.append(record)
+        self.revision += 1
+        self._schedule_flush()
+
+    @_synchronized
+    def replace(self, state: dict):
+        """Swap in a whole new state document."""
+        self._set_state(state)
+        for key, value in state.items():
+            self._record({"op": "set", "key": key, "value": value})
+
+    @_synchronized
+    def _write(self):
+        """Write pending changes to disk (no-op if nothing is pending).
+
+        Compare-and-swap: under the lock, if the file is not what we loaded,
+        reload it and merge our records onto it rather than overwrite it.
+        """
+        if not self._pending:
+            return
+
+        with _file_lock(self.path):
+            if self._stamps() != self._stamp:
+                state = self._read()
+                if state["version"] != self._state["version"]:
+                    logger.info(
+                        f"{self.path} moved from version {self._state['version']} "
+                        f"to {state['version']} since it was loaded; merging"
+                    )
+                for record in self._pending:
+                    _apply(state, record, merge=True)
+                self._set_state(state)
+
+            with metrics.state_save.time():
+                if self.journal_path:
+                    self._append_journal(self._resolved(self._pending))
+                    if self._journal_due():
+                        self._compact()
+                else:
+                    self._state["version"] += 1
+                    _atomic_write_json(self.path, self._state)
+            self._stamp = self._stamps()
+            self._pending.clear()
+
+    def _resolved(self, records: list[dict]) -> list[dict]:
+        """Records to journal: "set" records carry the merged value, once per key."""
+        out, keys = [], []
+        for record in records:
+            if record["op"] != "set":
+                out.append(record)
+            elif record["key"] not in keys:
+                keys.append(record["key"])
+        return out + [
+            {"op": "set", "key": key, "value": self._state[key]} for key in keys
+        ]
+
+    def _append_journal(self, records: list[dict]):
+        _ensure_dir(self.journal_path)
+        now = time.time()
+        with open(self.journal_path, "a+b") as f:
+            # Start on a fresh line if a previous append was torn
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            for record in records:
+                f.write((json.dumps({"ts": now, **record}) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        if self._journal_since is None:
+            self._journal_since = now
+
+    def _journal_due(self) -> bool:
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return False
+        if size >= STATE_JOURNAL_MAX_BYTES:
+            return True
+        since = self._journal_since
+        return since is not None and time.time() - since >= STATE_JOURNAL_MAX_AGE
+
+    @_synchronized
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate it."""
+        if self.journal_path is None:
+            return
+        self.flush()
+        with _file_lock(self.path):
+            self._compact()
+
+    def _compact(self):
+        # Re-read under the lock: the journal may hold other writers' records
+        state = self._read()
+        state["version"] += 1
+        _atomic_write_json(self.path, state)
+        # A crash before this truncate only means the records get replayed
+        # again on the next load, which is harmless.
+        open(self.journal_path, "w").close()
+        self._journal_since = None
+        self._set_state(state)
+        self._stamp = self._stamps()
+
+    # -- Domain operations --
+
+    @_synchronized
+    def value(self, key: str, default=None):
+        return self.get().get(key, default)
+
+    @_synchronized
+    def completed(self, week: int) -> list[int]:
+        return list(self.get()["completed"].get(str(week), []))
+
+    @_synchronized
+    def mark_done(self, week: int, task_index: int) -> bool:
+        record = {"op": "done", "week": week, "task": task_index}
+        if not _apply(self.get(), record):
+            return False
+        self._record(record)
+        return True
+
+    @_synchronized
+    def is_seen(self, url: str) -> bool:
+        self.get()
+        return url in self._seen
+
+    @_synchronized
+    def add_seen(self, url: str):
+        if self.is_seen(url):
+            return
+        record = {"op": "seen", "url": url}
+        state = self.get()
+        _apply(state, record)
+        self._seen = set(state["seen_issues"])
+        self._record(record)
+
+    @_synchronized
+    def advance_notify_index(self) -> int:
+        idx = self.get().get("notify_index", 0)
+        self.set("notify_index", (idx + 1) % 6)
+        return idx
+
+    @_synchronized
+    def set(self, key: str, value):
+        record = {"op": "set", "key": key, "value": value}
+        _apply(self.get(), record)
+        self._record(record)
+
+
+def _ensure_dir(path: str):
+    dirname = os.path.dirname(path)
     if dirname:
         os.makedirs(dirname, exist_ok=True)
 
 
-def load_state() -> dict:
-    _ensure_dir()
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    return DEFAULT_STATE.copy()
+def _open_store() -> WriteBackStore:
+    """Pick the storage backend from STATE_BACKEND or STATE_FILE's extension."""
+    backend = STATE_BACKEND or (
+        "sqlite" if STATE_FILE.endswith(SQLITE_SUFFIXES) else "json"
+    )
+    if backend == "json":
+        return StateStore(STATE_FILE, journal=STATE_JOURNAL)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown STATE_BACKEND: {backend!r}")
+
+    from state_sqlite import SqliteStateStore
+
+    if STATE_FILE.endswith(SQLITE_SUFFIXES):
+        db_path = STATE_FILE
+        json_path = os.path.splitext(STATE_FILE)[0] + ".json"
+    else:
+        db_path = os.path.splitext(STATE_FILE)[0] + ".db"
+        json_path = STATE_FILE
+
+    fresh = not os.path.exists(db_path)
+    store = SqliteStateStore(db_path)
+    if fresh and os.path.exists(json_path):
+        logger.info(f"Migrating {json_path} into {db_path}")
+        store.import_state(StateStore(json_path, journal=True).get())
+    return store
+
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+_store = _open_store()
+_tenant_stores: dict[str, WriteBackStore] = {}
+_tenant_stores_lock = threading.Lock()
+
+
+def tenant_state_path(chat_id: str) -> str:
+    return os.path.join(TENANT_STATE_DIR, f"{chat_id}.json")
+
+
+def get_store(chat_id: str | None = None) -> WriteBackStore:
+    """Return the state store for a chat (the owner's / default store if None).
+
+    Each tenant chat has its own file, so reading or writing one chat's
+    state never touches another's.
+    """
+    if chat_id is None or str(chat_id) == str(TELEGRAM_CHAT_ID):
+        return _store
+    chat_id = str(chat_id)
+    with _tenant_stores_lock:
+        store = _tenant_stores.get(chat_id)
+        if store is None:
+            store = StateStore(tenant_state_path(chat_id), journal=STATE_JOURNAL)
+            store.flush_delay = _store.flush_delay
+            _tenant_stores[chat_id] = store
+    return store
+
 
+def flush_state():
+    """Write any pending state changes to disk."""
+    _store.flush()
+    for store in list(_tenant_stores.values()):
+        store.flush()
 
-def save_state(state: dict):
-    _ensure_dir()
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
 
+atexit.register(flush_state)
 
-def get_current_week() -> int:
+
+def compact_state():
+    """Fold the mutation journal (if any) into the snapshot."""
+    _store.flush()
+    _store.compact()
+
+
+def load_state(chat_id: str | None = None) -> dict:
+    return get_store(chat_id).get()
+
+
+def save_state(state: dict, chat_id: str | None = None):
+    store = get_store(chat_id)
+    store.replace(state)
+    store.flush()
+
+
+def get_state_value(key: str, default=None, chat_id: str | None = None):
+    """Read one top-level state field."""
+    return get_store(chat_id).value(key, default)
+
+
+def set_state_value(key: str, value, chat_id: str | None = None):
+    """Overwrite one top-level state field."""
+    get_store(chat_id).set(key, value)
+
+
+def get_current_week(chat_id: str | None = None) -> int:
     """Calculate current week number based on start date."""
-    state = load_state()
-    start = datetime.strptime(state["start_date"], "%Y-%m-%d").date()
+    start_date = get_state_value("start_date", chat_id=chat_id)
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
     today = date.today()
     days_elapsed = (today - start).days
     week = (days_elapsed // 7) + 1
     return max(1, week)
 
 
-def get_completed_tasks(week: int) -> list[int]:
+def get_completed_tasks(week: int, chat_id: str | None = None) -> list[int]:
     """Get list of completed task indices (0-based) for a week."""
-    state = load_state()
-    return state["completed"].get(str(week), [])
-
-
-def mark_task_done(week: int, task_index: int) -> bool:
-    """Mark a task as done. Returns True if it was newly completed."""
-    state = load_state()
-    week_key = str(week)
-    if week_key not in state["completed"]:
-        state["completed"][week_key] = []
-    if task_index not in state["completed"][week_key]:
-        state["completed"][week_key].append(task_index)
-        save_state(state)
-        return True
-    return False
+    return get_store(chat_id).completed(week)
+
 
+def mark_task_done(
+    week: int,
+    task_index: int,
+    tasks_hash: str | None = None,
+    chat_id: str | None = None,
+) -> bool:
+    """Mark a task as done. Returns True if it was newly completed.
 
-def get_incomplete_tasks(week: int, all_tasks: list[str]) -> list[tuple[int, str]]:
+    tasks_hash (see tasks.get_week_hash) records which version of the week's
+    task list the completion refers to.
+    """
+    store = get_store(chat_id)
+    with store._mutex:
+        was_new = store.mark_done(week, task_index)
+        if was_new and tasks_hash:
+            hashes = dict(store.value("task_hashes") or {})
+            if str(week) not in hashes:
+                hashes[str(week)] = tasks_hash
+                store.set("task_hashes", hashes)
+    return was_new
+
+
+def tasks_changed_since_completion(
+    week: int, tasks_hash: str, chat_id: str | None = None
+) -> bool:
+    """True if the week's task text changed after tasks were marked done,
+    so the stored completion indices may point at different tasks."""
+    recorded = (get_state_value("task_hashes", chat_id=chat_id) or {}).get(str(week))
+    return recorded is not None and recorded != tasks_hash
+
+
+def get_incomplete_tasks(
+    week: int, all_tasks: list[str], chat_id: str | None = None
+) -> list[tuple[int, str]]:
     """Return list of (index, task_text) for incomplete tasks."""
-    completed = get_completed_tasks(week)
+    completed = set(get_completed_tasks(week, chat_id))
     return [(i, t) for i, t in enumerate(all_tasks) if i not in completed]
 
 
-def all_tasks_complete(week: int, total_tasks: int) -> bool:
+def all_tasks_complete(week: int, total_tasks: int, chat_id: str | None = None) -> bool:
     """Check if all tasks for a week are done."""
-    completed = get_completed_tasks(week)
+    completed = get_completed_tasks(week, chat_id)
     return len(completed) >= total_tasks
 
 
 def add_seen_issue(url: str):
-    state = load_state()
-    if url not in state["seen_issues"]:
-        state["seen_issues"].append(url)
-        # Keep only last 200 to prevent unbounded growth
-        state["seen_issues"] = state["seen_issues"][-200:]
-        save_state(state)
+    _store.add_seen(url)
 
 
 def is_issue_seen(url: str) -> bool:
-    state = load_state()
-    return url in state["seen_issues"]
+    return _store.is_seen(url)
 
 
-def get_and_advance_notify_index() -> int:
+def get_and_advance_notify_index(chat_id: str | None = None) -> int:
     """Get current notify slot (0-5) and advance for next call."""
-    state = load_state()
-    idx = state.get("notify_index", 0)
-    state["notify_index"] = (idx + 1) % 6
-    save_state(state)
-    return idx
+    return get_store(chat_id).advance_notify_index()
+
+
+# -- Async API for main.py (bot handlers, scheduler jobs, outbox) --
+#
+# The functions above do file I/O. On the event loop, use these instead: each
+# runs its sync twin on the state I/O thread, holding the chat's asyncio lock
+# so that read-modify-write sequences from concurrent handlers don't
+# interleave. The lock is not reentrant — don't await one of these from a
+# function that is itself running under run_locked.
+
+_async_locks: dict[int, asyncio.Lock] = {}
+
+
+def state_lock(chat_id: str | None = None) -> asyncio.Lock:
+    """The asyncio lock serializing async access to one chat's store."""
+    store = get_store(chat_id)
+    lock = _async_locks.get(id(store))
+    if lock is None:
+        lock = _async_locks[id(store)] = asyncio.Lock()
+    return lock
+
+
+async def run_locked(chat_id: str | None, fn, /, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the state I/O thread under the chat's lock."""
+    store = get_store(chat_id)
+    loop = asyncio.get_running_loop()
+    store._loop = loop
+    async with state_lock(chat_id):
+        return await loop.run_in_executor(
+            _executor, functools.partial(fn, *args, **kwargs)
+        )
+
+
+async def aget_state_value(key: str, default=None, chat_id: str | None = None):
+    return await run_locked(chat_id, get_state_value, key, default, chat_id=chat_id)
@@ -0,0 +1,160 @@
+"""
+Deterministic merging of bot state written by more than one party.
+
+state.json is written by scheduled run.py invocations (which can overlap),
+by the long-running main.py, and by the workflow's commit step. Each field
+below has a merge rule that doesn't depend on who wrote last:
+
+- completed, seen_issues: set union (completions are never taken back)
+- last_update_id, version: max
+- task_hashes: the first hash recorded for a week is kept
+- job_runs, issue_cursors: newest mark per job / query
+- outbox: union of messages; delivered or dead ones leave the pending list
+
+Any other field is last-writer-wins (incoming over current).
+
+state.py applies these rules when its compare-and-swap write finds that
+the file moved on since it was loaded. This module also works as a git merge
+driver, so that concurrent workflow commits rebase cleanly (see
+.gitattributes and notify.yml):
+
+    python state_merge.py %O %A %B
+"""
+
+import json
+import sys
+
+# Keep only the last N seen issue URLs to prevent unbounded growth
+SEEN_ISSUES_LIMIT = 200
+
+
+def _union_list(current: list, incoming: list) -> list:
+    return current + [x for x in incoming if x not in current]
+
+
+def _completed(current: dict, incoming: dict) -> dict:
+    return {
+        week: sorted(set(current.get(week, [])) | set(incoming.get(week, [])))
+        for week in _union_list(list(current), list(incoming))
+    }
+
+
+def _seen_issues(current: list, incoming: list) -> list:
+    return _union_list(current, incoming)[-SEEN_ISSUES_LIMIT:]
+
+
+def _first_wins(current: dict, incoming: dict) -> dict:
+    return {**incoming, **current}
+
+
+def _newest(current: dict, incoming: dict) -> dict:
+    merged = dict(current)
+    for key, value in incoming.items():
+        if key not in merged or _mark(value) > _mark(merged[key]):
+            merged[key] = value
+    return merged
+
+
+def _mark(value):
+    """Comparable form of a job_runs time or an issue_cursors mark."""
+    if isinstance(value, dict):
+        return (
+            value.get("created_at") or "",
+            value.get("number") or 0,
+            value.get("polled_at") or "",
+        )
+    return value
+
+
+def _outbox(current: dict, incoming: dict) -> dict:
+    sent = dict(current.get("sent", {}))
+    for key, at in incoming.get("sent", {}).items():
+        sent[key] = max(at, sent.get(key, at))
+    dead = list(current.get("dead", []))
+    dead_keys = {m["key"] for m in dead}
+    dead += [m for m in incoming.get("dead", []) if m["key"] not in dead_keys]
+    dead_keys |= {m["key"] for m in dead}
+
+    pending: dict[str, dict] = {}
+    for msg in current.get("pending", []) + incoming.get("pending", []):
+        if msg["key"] in sent or msg["key"] in dead_keys:
+            continue
+        known = pending.get(msg["key"])
+        # The copy that has been tried more often knows more
+        if known is None or msg["attempts"] > known["attempts"]:
+            pending[msg["key"]] = msg
+    return {"pending": list(pending.values()), "dead": dead, "sent": sent}
+
+
+RULES = {
+    "completed": _completed,
+    "seen_issues": _seen_issues,
+    "last_update_id": max,
+    "version": max,
+    "task_hashes": _first_wins,
+    "job_runs": _newest,
+    "issue_cursors": _newest,
+    "outbox": _outbox,
+}
+
+
+def merge_value(key: str, current, incoming):
+    """Merge one top-level field. Without a rule the incoming value wins."""
+    rule = RULES.get(key)
+    if rule is None or current is None:
+        return incoming
+    if incoming is None:
+        return current
+    return rule(current, incoming)
+
+
+def merge_states(ours: dict, theirs: dict, base: dict | None = None) -> dict:
+    """Three-way merge of two state documents (base may be None).
+
+    Fields without a rule take the side that changed relative to base; if
+    both changed, the document with the higher version wins (ours on a tie).
+    The result's version is one above both inputs.
+    """
+    base = base or {}
+    ours_first = ours.get("version", 0) >= theirs.get("version", 0)
+    merged = {}
+    for key in list(ours) + [k for k in theirs if k not in ours]:
+        a, b = ours.get(key), theirs.get(key)
+        if key in RULES:
+            merged[key] = merge_value(key, a, b)
+        elif key not in theirs or b == base.get(key):
+            merged[key] = a
+        elif key not in ours or a == base.get(key):
+            merged[key] = b
+        else:
+            merged[key] = a if ours_first else b
+    merged["version"] = max(ours.get("version", 0), theirs.get("version", 0)) + 1
+    return merged
+
+
+def _load(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def main(argv: list[str]) -> int:
+    """git merge driver: merge %A (ours) with %B (theirs) over %O, into %A."""
+    if len(argv) != 3:
+        print("Usage: python state_merge.py <base> <ours> <theirs>", file=sys.stderr)
+        return 2
+    base_path, ours_path, theirs_path = argv
+    ours, theirs = _load(ours_path), _load(theirs_path)
+    if not ours or not theirs:
+        # Not a state document we can read — let git report the conflict
+        return 1
+    merged = merge_states(ours, theirs, _load(base_path))
+    with open(ours_path, "w") as f:
+        json.dump(merged, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,296 @@
+"""
+SQLite storage backend for state.py.
+
+Completions and seen issues live in their own tables keyed by primary key,
+so dedup lookups are index seeks no matter how long the history gets (and
+there is no 200-entry cap). Scalar fields such as start_date and
+notify_index live in a JSON-encoded key/value table.
+
+Every mutation commits in its own short BEGIN IMMEDIATE transaction, so a
+second process writing the same database waits milliseconds, not a whole
+run. Completions and seen issues are rows, so they merge by construction. Fields whose
+state_merge.py rule is max (last_update_id) are upserted with MAX() so a
+slower writer can't move them back.
+
+Migrate an existing state file once with:
+    python state_sqlite.py state.json state.db
+"""
+
+import copy
+import json
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import metrics
+from state import DEFAULT_STATE, StateStore, WriteBackStore, _synchronized
+from state_merge import RULES
+
+# How long a writer waits for another process's transaction (seconds)
+BUSY_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completed (
+    week INTEGER NOT NULL,
+    task INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (week, task)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS seen_issues (
+    url TEXT PRIMARY KEY,
+    first_seen TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS seen_issues_first_seen ON seen_issues (first_seen);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SqliteStateStore(WriteBackStore):
+    """State store backed by a WAL-mode SQLite database.
+
+    Unlike the JSON store nothing is buffered: each mutation is its own
+    transaction (cheap with WAL and synchronous=NORMAL), so the write lock
+    is never held across a debounce window or a network call.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        # Used from the loop thread and the state I/O thread; _mutex
+        # serializes access. Autocommit: transactions are explicit.
+        self._conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT * 1000}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._depth = 0
+        self._data_version = self._get_data_version()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE … COMMIT around a mutation (nested calls join it)."""
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        with metrics.state_save.time():
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _get_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _changed(self):
+        self.revision += 1
+
+    def _write(self):
+        # Every mutation is already committed
+        pass
+
+    @_synchronized
+    def check(self):
+        # data_version moves when another connection commits
+        version = self._get_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self.revision += 1
+
+    @_synchronized
+    def compact(self):
+        self.flush()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    @_synchronized
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    # -- Whole-document access (compatibility with load_state/save_state) --
+
+    @_synchronized
+    def get(self) -> dict:
+        with metrics.state_load.time():
+            return self._get()
+
+    def _get(self) -> dict:
+        state = copy.deepcopy(DEFAULT_STATE)
+        for key, value in self._conn.execute("SELECT key, value FROM meta"):
+            state[key] = json.loads(value)
+
+        completed: dict[str, list[int]] = {}
+        for week, task in self._conn.execute(
+            "SELECT week, task FROM completed ORDER BY week, completed_at"
+        ):
+            completed.setdefault(str(week), []).append(task)
+        state["completed"] = completed
+        state["seen_issues"] = [
+            url
+            for (url,) in self._conn.execute(
+                "SELECT url FROM seen_issues ORDER BY first_seen, url"
+            )
+        ]
+        return state
+
+    @_synchronized
+    def replace(self, state: dict):
+        """Make the database match a whole state document."""
+        with self._transaction():
+            self._replace(state)
+        self._changed()
+
+    def _replace(self, state: dict):
+        now = _now()
+        wanted = {
+            (int(week), task)
+            for week, tasks in state.get("completed", {}).items()
+            for task in tasks
+        }
+        have = set(self._conn.execute("SELECT week, task FROM completed"))
+        self._conn.executemany(
+            "DELETE FROM completed WHERE week = ? AND task = ?", have - wanted
+        )
+        self._conn.executemany(
+            "INSERT INTO completed (week, task, completed_at) VALUES (?, ?, ?)",
+            [(week, task, now) for week, task in wanted - have],
+        )
+
+        urls = set(state.get("seen_issues", []))
+        have_urls = {url for (url,) in self._conn.execute("SELECT url FROM seen_issues")}
+        self._conn.executemany(
+            "DELETE FROM seen_issues WHERE url = ?", [(u,) for u in have_urls - urls]
+        )
+        self._conn.executemany(
+            "INSERT INTO seen_issues (url, first_seen) VALUES (?, ?)",
+            [
+                (url, now)
+                for url in state.get("seen_issues", [])
+                if url not in have_urls
+            ],
+        )
+
+        for key, value in state.items():
+            if key not in ("completed", "seen_issues"):
+                self.set(key, value)
+
+    @_synchronized
+    def import_state(self, state: dict):
+        """One-shot migration from a JSON state document."""
+        self.replace(state)
+        self.flush()
+
+    # -- Domain operations --
+
+    @_synchronized
+    def value(self, key: str, default=None):
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            if key in DEFAULT_STATE:
+                return copy.deepcopy(DEFAULT_STATE[key])
+            return default
+        return json.loads(row[0])
+
+    @_synchronized
+    def set(self, key: str, value):
+        if RULES.get(key) is max:
+            update = (
+                "value = CASE WHEN CAST(excluded.value AS REAL) > CAST(value AS REAL) "
+                "THEN excluded.value ELSE value END"
+            )
+        else:
+            update = "value = excluded.value"
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                f"ON CONFLICT (key) DO UPDATE SET {update}",
+                (key, json.dumps(value)),
+            )
+        self._changed()
+
+    @_synchronized
+    def completed(self, week: int) -> list[int]:
+        return [
+            task
+            for (task,) in self._conn.execute(
+                "SELECT task FROM completed WHERE week = ? ORDER BY completed_at",
+                (week,),
+            )
+        ]
+
+    @_synchronized
+    def mark_done(self, week: int, task_index: int) -> bool:
+        with self._transaction():
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO completed (week, task, completed_at) VALUES (?, ?, ?)",
+                (week, task_index, _now()),
+            )
+        if cur.rowcount:
+            self._changed()
+        return cur.rowcount > 0
+
+    @_synchronized
+    def is_seen(self, url: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM seen_issues WHERE url = ?", (url,)
+        ).fetchone()
+        return row is not None
+
+    @_synchronized
+    def add_seen(self, url: str):
+        with self._transaction():
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO seen_issues (url, first_seen) VALUES (?, ?)",
+                (url, _now()),
+            )
+        if cur.rowcount:
+            self._changed()
+
+    @_synchronized
+    def advance_notify_index(self) -> int:
+        # Read and write in one transaction so two processes can't take the
+        # same slot
+        with self._transaction():
+            idx = self.value("notify_index", 0)
+            self.set("notify_index", (idx + 1) % 6)
+        return idx
+
+
+def migrate(json_path: str, db_path: str):
+    """Copy a JSON state file (and its journal, if any) into a SQLite database."""
+    store = SqliteStateStore(db_path)
+    store.import_state(StateStore(json_path, journal=True).get())
+    store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python state_sqlite.py <state.json> <state.db>")
+        sys.exit(1)
+    migrate(sys.argv[1], sys.argv[2])
+    print(f"Migrated {sys.argv[1]} -> {sys.argv[2]}")
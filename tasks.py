@@ -1,26 +1,163 @@
 """
 Weekly task batches loaded from tasks.json.
 Each week has exactly 6 tasks. Tasks are specific and actionable.
+
+The catalog is validated and precompiled into a week -> tasks lookup with a
+content hash per week. tasks.json is watched by mtime and size, so edits
+(e.g. from the web dashboard) are picked up without a restart; a file that
+fails validation is logged and the previous catalog stays in use. Nothing is
+read until the first lookup, so importing this module is free.
 """
 
+import contextlib
+import hashlib
 import json
+import logging
 import os
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
 
 _dir = os.path.dirname(os.path.abspath(__file__))
 _tasks_file = os.path.join(_dir, "tasks.json")
 
-with open(_tasks_file, "r") as f:
-    _data = json.load(f)
+TASKS_PER_WEEK = 6
+
+# Appended to task listings when tasks.json changed after completions were recorded
+EDITED_WEEK_NOTE = (
+    "\n_This week's task list was edited after some tasks were marked done — "
+    "double-check the ticks._"
+)
+
+
+class TaskCatalogError(ValueError):
+    """tasks.json doesn't match the expected schema."""
+
+
+def _hash_tasks(tasks: tuple[str, ...]) -> str:
+    return hashlib.sha256("\n".join(tasks).encode()).hexdigest()[:12]
+
+
+def _check_batch(name: str, tasks) -> tuple[str, ...]:
+    if not isinstance(tasks, list) or len(tasks) != TASKS_PER_WEEK:
+        raise TaskCatalogError(f"{name} must be a list of {TASKS_PER_WEEK} tasks")
+    if not all(isinstance(t, str) and t.strip() for t in tasks):
+        raise TaskCatalogError(f"{name} has an empty or non-text task")
+    return tuple(tasks)
+
+
+@dataclass(frozen=True)
+class _Compiled:
+    weeks: dict[int, tuple[str, ...]]
+    maintenance: tuple[str, ...]
+    hashes: dict[int, str]
+    maintenance_hash: str
+    version: str  # hash of the whole catalog
+
+
+def _compile(data: dict) -> _Compiled:
+    if not isinstance(data.get("weekly_tasks"), dict):
+        raise TaskCatalogError("weekly_tasks must be an object keyed by week number")
+    weeks = {}
+    for key, tasks in data["weekly_tasks"].items():
+        try:
+            week = int(key)
+        except ValueError:
+            raise TaskCatalogError(f"week key {key!r} is not a number") from None
+        weeks[week] = _check_batch(f"week {key}", tasks)
+    maintenance = _check_batch("maintenance_tasks", data.get("maintenance_tasks"))
+
+    hashes = {week: _hash_tasks(tasks) for week, tasks in weeks.items()}
+    maintenance_hash = _hash_tasks(maintenance)
+    version = hashlib.sha256(
+        json.dumps([sorted(hashes.items()), maintenance_hash]).encode()
+    ).hexdigest()[:12]
+    return _Compiled(weeks, maintenance, hashes, maintenance_hash, version)
 
-WEEKLY_TASKS: dict[int, list[str]] = {
-    int(k): v for k, v in _data["weekly_tasks"].items()
-}
 
-MAINTENANCE_TASKS: list[str] = _data["maintenance_tasks"]
+class TaskCatalog:
+    """Validated, hot-reloadable view of tasks.json."""
 
+    def __init__(self, path: str):
+        self.path = path
+        self._stamp: tuple[int, int] | None = None
+        self._compiled: _Compiled | None = None
 
-def get_tasks_for_week(week_number: int) -> list[str]:
+    def _file_stamp(self) -> tuple[int, int]:
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self) -> _Compiled:
+        stamp = self._file_stamp()
+        with open(self.path, "r") as f:
+            compiled = _compile(json.load(f))
+        self._stamp = stamp
+        return compiled
+
+    def refresh(self) -> _Compiled:
+        """Swap in a new catalog if the file changed since the last load."""
+        if self._compiled is None:
+            self._compiled = self._load()
+            return self._compiled
+        try:
+            changed = self._file_stamp() != self._stamp
+        except FileNotFoundError:
+            return self._compiled
+        if changed:
+            try:
+                compiled = self._load()
+            except (OSError, ValueError) as e:
+                logger.error(f"Ignoring invalid {self.path}: {e}")
+                # Don't retry until the file changes again
+                with contextlib.suppress(OSError):
+                    self._stamp = self._file_stamp()
+            else:
+                if compiled.version != self._compiled.version:
+                    logger.info(f"Task catalog reloaded (version {compiled.version})")
+                self._compiled = compiled
+        return self._compiled
+
+    @property
+    def version(self) -> str:
+        return self.refresh().version
+
+    def as_dict(self) -> dict:
+        """The catalog in tasks.json's shape, plus its version."""
+        compiled = self.refresh()
+        return {
+            "weekly_tasks": {str(w): list(t) for w, t in sorted(compiled.weeks.items())},
+            "maintenance_tasks": list(compiled.maintenance),
+            "version": compiled.version,
+        }
+
+    def tasks_for_week(self, week_number: int) -> list[str]:
+        compiled = self.refresh()
+        return list(compiled.weeks.get(week_number, compiled.maintenance))
+
+    def week_hash(self, week_number: int) -> str:
+        compiled = self.refresh()
+        return compiled.hashes.get(week_number, compiled.maintenance_hash)
+
+
+catalog = TaskCatalog(_tasks_file)
+_roadmaps: dict[str, TaskCatalog] = {}
+
+
+def get_catalog(roadmap: str | None = None) -> TaskCatalog:
+    """Catalog for a roadmap file next to tasks.json (default: tasks.json)."""
+    if not roadmap or roadmap == "tasks.json":
+        return catalog
+    name = os.path.basename(roadmap)
+    if name not in _roadmaps:
+        _roadmaps[name] = TaskCatalog(os.path.join(_dir, name))
+    return _roadmaps[name]
+
+
+def get_tasks_for_week(week_number: int, roadmap: str | None = None) -> list[str]:
     """Return the 6 tasks for a given week number."""
-    if week_number in WEEKLY_TASKS:
-        return WEEKLY_TASKS[week_number]
-    return MAINTENANCE_TASKS
+    return get_catalog(roadmap).tasks_for_week(week_number)
+
+
+def get_week_hash(week_number: int, roadmap: str | None = None) -> str:
+    """Content hash of a week's task list (changes when the text changes)."""
+    return get_catalog(roadmap).week_hash(week_number)
@@ -0,0 +1,114 @@
+"""
+Chats served by this bot.
+
+Without MULTI_TENANT there is exactly one tenant: TELEGRAM_CHAT_ID (the
+owner). With it, every chat in TENANT_CHAT_IDS and every chat that already
+has a state file in TENANT_STATE_DIR is a tenant too, each with its own start
+date and roadmap stored in its own state.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date, timedelta
+
+from config import (
+    TELEGRAM_CHAT_ID,
+    MULTI_TENANT,
+    TENANT_CHAT_IDS,
+    TENANT_OPEN_SIGNUP,
+    TENANT_STATE_DIR,
+    TENANT_CONCURRENCY,
+)
+from state import (
+    get_state_value,
+    set_state_value,
+    get_store,
+    tenant_state_path,
+    run_locked,
+)
+from tasks import get_tasks_for_week, get_week_hash
+
+logger = logging.getLogger(__name__)
+
+
+def is_owner(chat_id) -> bool:
+    return str(chat_id) == str(TELEGRAM_CHAT_ID)
+
+
+def list_tenants() -> list[str]:
+    """All chat IDs to notify, owner first."""
+    chats = [str(TELEGRAM_CHAT_ID)] if TELEGRAM_CHAT_ID else []
+    if MULTI_TENANT:
+        chats += TENANT_CHAT_IDS
+        if os.path.isdir(TENANT_STATE_DIR):
+            chats += [
+                name[: -len(".json")]
+                for name in os.listdir(TENANT_STATE_DIR)
+                if name.endswith(".json")
+            ]
+    return list(dict.fromkeys(chats))
+
+
+def is_tenant(chat_id) -> bool:
+    if is_owner(chat_id):
+        return True
+    if not MULTI_TENANT:
+        return False
+    chat_id = str(chat_id)
+    return chat_id in TENANT_CHAT_IDS or os.path.exists(tenant_state_path(chat_id))
+
+
+def can_register(chat_id) -> bool:
+    return MULTI_TENANT and TENANT_OPEN_SIGNUP and not is_tenant(chat_id)
+
+
+def register(chat_id) -> bool:
+    """Create state for a new chat, starting its roadmap this week (Monday)."""
+    chat_id = str(chat_id)
+    if not MULTI_TENANT or is_owner(chat_id) or os.path.exists(tenant_state_path(chat_id)):
+        return False
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    set_state_value("start_date", monday.isoformat(), chat_id=chat_id)
+    get_store(chat_id).flush()
+    logger.info(f"Registered chat {chat_id}")
+    return True
+
+
+def roadmap_for(chat_id) -> str | None:
+    """Tasks file this chat follows (None = tasks.json)."""
+    if is_owner(chat_id):
+        return None
+    return get_state_value("roadmap", chat_id=str(chat_id))
+
+
+def tasks_for(chat_id, week: int) -> list[str]:
+    return get_tasks_for_week(week, roadmap_for(chat_id))
+
+
+def week_hash_for(chat_id, week: int) -> str:
+    return get_week_hash(week, roadmap_for(chat_id))
+
+
+async def fan_out(job, chats: list[str] | None = None) -> dict:
+    """
+    Run `await job(chat_id)` for every tenant, at most TENANT_CONCURRENCY at
+    a time. Returns {chat_id: result}; a failing chat is logged and maps to
+    None so it can't stop the others.
+    """
+    if chats is None:
+        # list_tenants() reads TENANT_STATE_DIR — keep that off the loop
+        chats = await run_locked(None, list_tenants)
+    sem = asyncio.Semaphore(TENANT_CONCURRENCY)
+
+    async def run(chat_id):
+        async with sem:
+            try:
+                return await job(chat_id)
+            except Exception as e:
+                logger.error(f"{getattr(job, '__name__', job)} failed for chat {chat_id}: {e}")
+                return None
+
+    results = await asyncio.gather(*(run(c) for c in chats))
+    return dict(zip(chats, results))
@@ -0,0 +1,50 @@
+"""
+Test setup. config.py reads the environment at import time, so everything
+points at throwaway state and at the fakes from bench/fake_servers.py
+before any bot module is imported. Tests serve the fakes on FAKE_PORT.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+FAKE_PORT = _free_port()
+_fake_url = f"http://127.0.0.1:{FAKE_PORT}"
+_workdir = tempfile.mkdtemp(prefix="daily-grind-tests-")
+
+os.environ.update({
+    "STATE_FILE": os.path.join(_workdir, "state.json"),
+    "TENANT_STATE_DIR": os.path.join(_workdir, "tenants"),
+    "TELEGRAM_BOT_TOKEN": "test",
+    "TELEGRAM_CHAT_ID": "1000",
+    "TELEGRAM_WEBHOOK_SECRET": "test-secret",
+    "GITHUB_TOKEN": "test",
+    "TELEGRAM_API_URL": _fake_url,
+    "CALLMEBOT_API_URL": _fake_url,
+    "GITHUB_API_URL": _fake_url,
+})
+for name in ("CALLMEBOT_PHONE", "CALLMEBOT_API_KEY", "METRICS_FILE", "STATE_BACKEND"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture
+def fresh_state(monkeypatch, tmp_path):
+    """Give the owner an empty state store for the length of one test."""
+    import state
+
+    store = state.StateStore(str(tmp_path / "state.json"))
+    monkeypatch.setattr(state, "_store", store)
+    return store
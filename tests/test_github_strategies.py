@@ -0,0 +1,47 @@
+"""check_new_issues() against the fake GitHub API, once per query strategy."""
+
+import asyncio
+from urllib.parse import urlsplit
+
+import pytest
+
+from fake_servers import FakeConfig, FakeServers, start
+from config import TARGET_REPOS
+import config
+import github_checker
+import http_client
+
+ISSUES_PER_REPO = 3
+PAGE_SIZE = 2  # so every listing runs to a second page
+
+# GitHub requests one poll makes for the default TARGET_REPOS and labels:
+# per_label: 6 repos x 3 labels x 2 pages; per_repo: 6 repos x 2 pages;
+# search: one query of 5 repos (15 issues, 8 pages) and one of 1 (2 pages)
+EXPECTED_CALLS = {"per_label": 36, "per_repo": 12, "search": 10}
+
+
+async def _poll(servers: FakeServers) -> list[dict]:
+    runner, _ = await start(servers, port=urlsplit(config.GITHUB_API_URL).port)
+    await http_client.start()
+    try:
+        return await github_checker.check_new_issues()
+    finally:
+        await http_client.close()
+        await runner.cleanup()
+
+
+@pytest.mark.parametrize("strategy, expected", EXPECTED_CALLS.items())
+def test_strategies_find_the_same_issues(monkeypatch, fresh_state, strategy, expected):
+    monkeypatch.setattr(github_checker, "GITHUB_QUERY_STRATEGY", strategy)
+    monkeypatch.setattr(github_checker, "GITHUB_MAX_PAGES", 10)
+    servers = FakeServers(FakeConfig(issues_per_repo=ISSUES_PER_REPO, page_size=PAGE_SIZE))
+
+    issues = asyncio.run(_poll(servers))
+
+    github_calls = sum(n for name, n in servers.calls.items() if name.startswith("github."))
+    assert github_calls == expected
+    assert {issue["url"] for issue in issues} == {
+        f"https://github.com/{repo}/issues/{n}"
+        for repo in TARGET_REPOS
+        for n in range(1, ISSUES_PER_REPO + 1)
+    }
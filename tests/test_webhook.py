@@ -0,0 +1,68 @@
+"""main.webhook_handler: the secret check and payload parsing."""
+
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import TELEGRAM_WEBHOOK_PATH
+import main
+
+SECRET = "test-secret"
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1000, "type": "private"},
+        "text": "/status",
+    },
+}
+
+
+async def _post(headers: dict, **kwargs):
+    """POST to the webhook. Returns (status, updates queued for the bot)."""
+    bot_app = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    app = web.Application()
+    app["bot_app"] = bot_app
+    app["webhook_secret"] = SECRET
+    app.router.add_post(TELEGRAM_WEBHOOK_PATH, main.webhook_handler)
+
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.post(TELEGRAM_WEBHOOK_PATH, headers=headers, **kwargs)
+    queued = []
+    while not bot_app.update_queue.empty():
+        queued.append(bot_app.update_queue.get_nowait())
+    return resp.status, queued
+
+
+def test_update_is_queued():
+    status, queued = asyncio.run(
+        _post({"X-Telegram-Bot-Api-Secret-Token": SECRET}, json=UPDATE)
+    )
+    assert status == 200
+    assert [u.update_id for u in queued] == [1]
+    assert queued[0].message.text == "/status"
+
+
+def test_bad_payload_is_rejected():
+    status, queued = asyncio.run(
+        _post({"X-Telegram-Bot-Api-Secret-Token": SECRET}, data=b"not json")
+    )
+    assert status == 400
+    assert queued == []
+
+
+def test_wrong_secret_is_forbidden():
+    status, queued = asyncio.run(
+        _post({"X-Telegram-Bot-Api-Secret-Token": "wrong"}, json=UPDATE)
+    )
+    assert status == 403
+    assert queued == []
+
+
+def test_missing_secret_is_forbidden():
+    status, queued = asyncio.run(_post({}, json=UPDATE))
+    assert status == 403
+    assert queued == []
@@ -1,8 +1,12 @@
 import { NextResponse } from "next/server";
 import { getFile } from "@/lib/github";
+import { botApiEnabled, botFetch } from "@/lib/bot";
 
 export async function GET() {
   try {
+    if (botApiEnabled) {
+      return NextResponse.json(await botFetch("/api/state"));
+    }
     const { content } = await getFile("state.json");
     const data = JSON.parse(content);
     return NextResponse.json(data);
@@ -0,0 +1,20 @@
+// Optional direct reads from the bot's API (main.py). When BOT_API_URL is
+// unset the dashboard keeps reading state.json through the GitHub API.
+const BOT_API_URL = process.env.BOT_API_URL;
+const BOT_API_TOKEN = process.env.BOT_API_TOKEN;
+
+export const botApiEnabled = Boolean(BOT_API_URL);
+
+export async function botFetch(path: string) {
+  const res = await fetch(`${BOT_API_URL!.replace(/\/$/, "")}${path}`, {
+    headers: BOT_API_TOKEN ? { Authorization: `Bearer ${BOT_API_TOKEN}` } : {},
+    cache: "no-store",
+  });
+
+  if (!res.ok) {
+    const body = await res.text();
+    throw new Error(`Bot API error ${res.status}: ${body}`);
+  }
+
+  return res.json();
+}